@@ -0,0 +1,117 @@
+"""Generates synthetic character graphs in the GraphML format of got.graphml.
+
+The degrees follow a power law: every new character links to a random number of
+existing characters, picked proportionally to their degree (preferential attachment).
+Houses, status, groups and relations are drawn from distributions like the ones of
+got.graphml. The file is written element by element, so it can be larger than memory.
+
+    $ python benchmarks/generate.py 10000 bench-10k.graphml
+"""
+import argparse
+import random
+from xml.sax.saxutils import escape
+
+HOUSES = ["House Stark", "House Baratheon", "House Targaryen", "House Lannister", "House Greyjoy",
+          "House Tully", "House Reed", "House Mormont", "House Martell", "House Clegane",
+          "House Bolton", "House Arryn", "House Tyrell", "House Frey", "House Tarth", "House Payne",
+          "Sand Snakes"]
+GROUPS = ["Brotherhood Without Banners", "Free Folk", "Night's Watch", "Sand Snakes", "Kingsguard"]
+STATUS = ["Alive", "Deceased"]
+
+# relation -> (weight, directed)
+RELATIONS = {
+    "sibling": (63, False),
+    "allegiance": (43, True),
+    "killed": (41, True),
+    "father": (34, True),
+    "mother": (14, True),
+    "spouse": (13, False),
+    "lover": (8, False),
+}
+
+KEYS = """    <key attr.name="status" attr.type="string" for="node" id="status"/>
+    <key attr.name="house-birth" attr.type="string" for="node" id="house-birth"/>
+    <key attr.name="name" attr.type="string" for="node" id="name"/>
+    <key attr.name="group" attr.type="string" for="node" id="group"/>
+    <key attr.name="relation" attr.type="string" id="relation"/>
+"""
+
+
+def house_weights(count):
+    # a few big houses and many small ones (zipf like)
+    return [1.0 / (rank + 1) for rank in range(0, count)]
+
+
+def generate_edges(node_count, edges_per_node, rng):
+    """Yields (source, target) pairs of a preferential attachment graph.
+
+    Each new node gets between 1 and 2 * edges_per_node - 1 edges, so there are
+    single edge nodes as in got.graphml, and about edges_per_node edges per node.
+    """
+    # every node appears once per edge end, picking from it is picking by degree
+    ends = []
+    for node in range(1, node_count):
+        count = min(node, rng.randint(1, 2 * edges_per_node - 1))
+        targets = set()
+        while len(targets) < count:
+            if ends and rng.random() < 0.9:
+                targets.add(ends[rng.randrange(len(ends))])
+            else:
+                targets.add(rng.randrange(node))
+        for target in targets:
+            ends.append(node)
+            ends.append(target)
+            yield (node, target)
+
+
+def write_graphml(path, node_count, edges_per_node=2, group_probability=0.05,
+                  deceased_probability=0.4, seed=1):
+    rng = random.Random(seed)
+    weights = house_weights(len(HOUSES))
+    relations = list(RELATIONS)
+    relation_weights = [RELATIONS[r][0] for r in relations]
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" ?>\n<graphml>\n')
+        f.write(KEYS)
+        f.write('    <graph edgedefault="directed" id="">\n')
+
+        for node in range(0, node_count):
+            f.write('        <node id="%d">\n' % node)
+            f.write('            <data key="status">%s</data>\n'
+                    % (STATUS[1] if rng.random() < deceased_probability else STATUS[0]))
+            if rng.random() < 0.8:
+                house = rng.choices(HOUSES, weights)[0]
+                f.write('            <data key="house-birth">%s</data>\n' % escape(house))
+            if rng.random() < group_probability:
+                f.write('            <data key="group">%s</data>\n' % escape(rng.choice(GROUPS)))
+            f.write('            <data key="name">Character %d</data>\n' % node)
+            f.write('        </node>\n')
+
+        for (source, target) in generate_edges(node_count, edges_per_node, rng):
+            relation = rng.choices(relations, relation_weights)[0]
+            directed = '' if RELATIONS[relation][1] else ' directed="false"'
+            f.write('        <edge source="%d" target="%d"%s>\n' % (source, target, directed))
+            f.write('            <data key="relation">%s</data>\n' % relation)
+            f.write('        </edge>\n')
+
+        f.write('    </graph>\n</graphml>\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generates a synthetic character graph as GraphML.")
+    parser.add_argument("nodes", type=int, help="number of characters")
+    parser.add_argument("output", help="the GraphML file to write")
+    parser.add_argument("--edges-per-node", type=int, default=2,
+                        help="average number of edges per new node")
+    parser.add_argument("--group-probability", type=float, default=0.05)
+    parser.add_argument("--deceased-probability", type=float, default=0.4)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    write_graphml(args.output, args.nodes, args.edges_per_node, args.group_probability,
+                  args.deceased_probability, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Times the stages of the svg.py pipeline on synthetic graphs of growing size.
+
+For every size a graph is generated (see generate.py) and run through
+Graph.load, Graph.update_graph, Graph.define_node_positions and draw_graph.
+The load_snapshot stage loads the same graph from a snapshot (see
+Graph.save_snapshot) into a second graph, to compare it with the GraphML load.
+Each stage is timed (wall and cpu time) in one run and its peak of traced
+memory is measured in a second run, because tracemalloc slows everything down.
+The results are compared with benchmarks/baselines.json; a stage that got slower
+or needs more memory than the tolerance allows is reported and makes the run fail.
+
+    $ python benchmarks/run.py --nodes 1000 10000
+    $ python benchmarks/run.py --nodes 1000 10000 --save-baseline
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import h3graph  # noqa: E402
+import h3graph.draw as draw  # noqa: E402
+from generate import write_graphml  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines.json")
+STAGES = ["load", "load_snapshot", "update_graph", "define_node_positions", "draw_graph"]
+
+
+def pipeline(graphml_path, svg_path, layout):
+    """The stages of svg.py as (name, function) pairs sharing one graph,
+    plus load_snapshot reading the snapshot next to the GraphML file."""
+    graph = h3graph.Graph()
+    snapshot_path = snapshot_path_of(graphml_path)
+    return [
+        ("load", lambda: graph.load(graphml_path)),
+        ("load_snapshot", lambda: h3graph.Graph().load_snapshot(snapshot_path)),
+        ("update_graph", graph.update_graph),
+        ("define_node_positions", lambda: graph.define_node_positions(layout)),
+        ("draw_graph", lambda: draw.draw_graph(graph, svg_path)),
+    ]
+
+
+def snapshot_path_of(graphml_path):
+    return os.path.splitext(graphml_path)[0] + ".snapshot"
+
+
+def time_stages(graphml_path, svg_path, layout):
+    result = dict()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for (name, stage) in pipeline(graphml_path, svg_path, layout):
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            stage()
+            result[name] = {"time": time.perf_counter() - wall, "cpu": time.process_time() - cpu}
+    return result
+
+
+def measure_memory(graphml_path, svg_path, layout):
+    result = dict()
+    tracemalloc.start()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for (name, stage) in pipeline(graphml_path, svg_path, layout):
+                tracemalloc.reset_peak()
+                stage()
+                result[name] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def case_name(nodes, edges_per_node, layout, seed):
+    return "nodes=%d,edges_per_node=%d,layout=%s,seed=%d" % (nodes, edges_per_node, layout, seed)
+
+
+def run_case(nodes, edges_per_node, layout, seed, memory, directory):
+    graphml_path = os.path.join(directory, "bench-%d.graphml" % nodes)
+    svg_path = os.path.join(directory, "bench-%d.svg" % nodes)
+    write_graphml(graphml_path, nodes, edges_per_node, seed=seed)
+    graph = h3graph.Graph()
+    graph.load(graphml_path)
+    graph.save_snapshot(snapshot_path_of(graphml_path))
+
+    result = time_stages(graphml_path, svg_path, layout)
+    result["bytes_written"] = os.path.getsize(svg_path)
+    if memory:
+        for (name, peak) in measure_memory(graphml_path, svg_path, layout).items():
+            result[name]["peak"] = peak
+    return result
+
+
+def compare(name, result, baseline, time_tolerance, memory_tolerance):
+    """Returns the regressions of a case against its baseline as messages."""
+    regressions = []
+    for stage in STAGES:
+        old = baseline.get(stage)
+        new = result[stage]
+        if old is None:
+            continue
+        if new["time"] > old["time"] * (1 + time_tolerance):
+            regressions.append("%s %s: %.3fs, baseline %.3fs"
+                               % (name, stage, new["time"], old["time"]))
+        if "peak" in new and "peak" in old and new["peak"] > old["peak"] * (1 + memory_tolerance):
+            regressions.append("%s %s: %d bytes peak, baseline %d"
+                               % (name, stage, new["peak"], old["peak"]))
+    return regressions
+
+
+def print_result(name, result, baseline):
+    print(name)
+    for stage in STAGES:
+        line = "  %-22s %9.3fs wall %9.3fs cpu" % (stage, result[stage]["time"],
+                                                   result[stage]["cpu"])
+        if "peak" in result[stage]:
+            line = line + " %10.1f MiB peak" % (result[stage]["peak"] / 2 ** 20)
+        if baseline is not None and stage in baseline:
+            line = line + "   (baseline %.3fs)" % baseline[stage]["time"]
+        print(line)
+    print("  %-22s %9d" % ("bytes written", result["bytes_written"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the graph pipeline on synthetic graphs.")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 10000],
+                        help="graph sizes to run")
+    parser.add_argument("--edges-per-node", type=int, default=2)
+    parser.add_argument("--layout", default="circular", help="layout engine (circular or force)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the (slower) memory measurement")
+    parser.add_argument("--time-tolerance", type=float, default=0.5,
+                        help="allowed slowdown against the baseline, 0.5 = 50%%")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2,
+                        help="allowed growth of the peak memory against the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="the baseline file")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as new baseline")
+    args = parser.parse_args()
+
+    # the drawing loads its assets relative to the repository
+    os.chdir(ROOT)
+
+    baselines = dict()
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    regressions = []
+    with tempfile.TemporaryDirectory() as directory:
+        for nodes in args.nodes:
+            name = case_name(nodes, args.edges_per_node, args.layout, args.seed)
+            result = run_case(nodes, args.edges_per_node, args.layout, args.seed,
+                              not args.no_memory, directory)
+            print_result(name, result, baselines.get(name))
+            if name in baselines:
+                regressions.extend(compare(name, result, baselines[name], args.time_tolerance,
+                                           args.memory_tolerance))
+            if args.save_baseline:
+                baselines[name] = result
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+    elif regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print("  " + regression)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,95 @@
-import xml.etree.ElementTree
+import importlib
 
-import h3graph.calc as calc
-import h3graph.draw as draw
-import statistics
+import h3graph.graphml as graphml
+import h3graph.instrument as instrument
+import h3graph.traversal as traversal
+from h3graph.degrees import DegreeStatistics
+from h3graph.instrument import logger
+from h3graph.properties import PropertyElement
 
 NODE_RADIUS = 40
 
+# submodules imported on first use only, most of them need svgwrite or numpy:
+# import h3graph gives the Graph for loading and querying without the rendering stack
+LAZY_SUBMODULES = ('batch', 'calc', 'centrality', 'draw', 'forcelayout', 'geometry', 'images',
+                   'labels', 'layout', 'page', 'service', 'snapshot', 'svgstream', 'tiles', 'views')
+
+# properties Graph keeps a hash index on (see Graph.query_nodes and Graph.query_edges)
+DEFAULT_INDEXED_PROPERTIES = ('house-birth', 'status', 'group', 'relation')
+
+# node properties set by the layout engines, changing them only increments Graph.layout_version
+LAYOUT_FIELDS = ('x', 'y')
+
 
 class Graph(object):
 
-    def __init__(self, nodes=list(), edges=list()):
-        self.nodes = nodes
-        self.edges = edges
-        self.max_edge_count = 0
-        self.median_edge_count = 0
-        self.mean_edge_count = 0
+    def __init__(self, nodes=None, edges=None, pinned_node_ids=None,
+                 indexed_properties=DEFAULT_INDEXED_PROPERTIES):
+        # nodes and edges in insertion order (dicts used as ordered sets, so removing one
+        # is O(1)), the nodes and edges lists are built from them on demand
+        self._node_order = dict()
+        self._edge_order = dict()
+        self._node_list = []
+        self._edge_list = []
+
+        # id -> node hash index and per-node incidence lists (keyed by node id).
+        # Undirected edges are filed under their source as outgoing and under
+        # their target as incoming, just like directed ones.
+        self._nodes_by_id = dict()
+        self._out_edges = dict()
+        self._in_edges = dict()
+
+        # Degrees are kept up to date on every edge insertion/removal, and so is the
+        # (insertion ordered) set of single edge nodes, id -> node.
+        # Pinned nodes count as single edge nodes as soon as they have any edge.
+        self._degrees = dict()
+        self._degree_statistics = DegreeStatistics()
+        self._single_edge_nodes = dict()
+        self.pinned_node_ids = set(pinned_node_ids or ())
+
+        # property -> value -> elements having it (dicts used as ordered sets)
+        self._node_index = dict((key, dict()) for key in indexed_properties)
+        self._edge_index = dict((key, dict()) for key in indexed_properties)
+
+        # version is incremented on every change of the graph, its nodes or edges except of
+        # the node positions, layout_version on every change of a position.
+        # Cached traversal results and views are only valid for the version they were computed for.
+        self.version = 0
+        self.layout_version = 0
+        self._traversal_cache = traversal.QueryCache()
+
+        for node in nodes or []:
+            self.add_node(node)
+        for edge in edges or []:
+            self.add_edge(edge)
+
+    def __setstate__(self, state):
+        # nodes and edges do not pickle their graph, attach them again
+        self.__dict__.update(state)
+        for element in self.nodes + self.edges:
+            object.__setattr__(element, '_graph', self)
+
+    @property
+    def nodes(self):
+        """The nodes in insertion order (or in the order of the last sort_nodes_by_property).
+
+        >>> graph = Graph()
+        >>> a, b, c = graph.add_new_node(1), graph.add_new_node(2), graph.add_new_node(3)
+        >>> graph.remove_node(b)
+        >>> n = graph.add_node(b)
+        >>> [n.id for n in graph.nodes]
+        [1, 3, 2]
+        """
+        if self._node_list is None:
+            self._node_list = list(self._node_order)
+        return self._node_list
+
+    @property
+    def edges(self):
+        """The edges in insertion order."""
+        if self._edge_list is None:
+            self._edge_list = list(self._edge_order)
+        return self._edge_list
 
     def add_node(self, node):
         if type(node) != Node:
@@ -24,7 +99,18 @@ class Graph(object):
         if existing_node is not None:
             self.remove_node(existing_node)
 
-        self.nodes.append(node)
+        self.version = self.version + 1
+        self._node_order[node] = None
+        if self._node_list is not None:
+            self._node_list.append(node)
+        self._nodes_by_id[node.id] = node
+        self._out_edges[node.id] = []
+        self._in_edges[node.id] = []
+        self._degrees[node.id] = 0
+        self._degree_statistics.add(0)
+        node.update_properties(edge_count=0)
+        self._index_element(self._node_index, node)
+        object.__setattr__(node, '_graph', self)
         return node
 
     def add_new_node(self, id, **properties):
@@ -36,29 +122,106 @@ class Graph(object):
         self.remove_node(node)
 
     def remove_node(self, node):
-        if node is None:
+        if node is None or self._nodes_by_id.get(node.id) is not node:
             return
         self.remove_edges_by_node(node)
-        self.nodes.remove(node)
+        self.version = self.version + 1
+        del self._node_order[node]
+        self._node_list = None
+        del self._nodes_by_id[node.id]
+        del self._out_edges[node.id]
+        del self._in_edges[node.id]
+        self._degree_statistics.remove(self._degrees.pop(node.id))
+        self._unindex_element(self._node_index, node)
+        object.__setattr__(node, '_graph', None)
 
     def add_edge(self, edge):
         if type(edge) != Edge:
             raise TypeError("Type must be H3Edge")
 
-        self.edges.append(edge)
+        self.version = self.version + 1
+        self._edge_order[edge] = None
+        if self._edge_list is not None:
+            self._edge_list.append(edge)
+        self._out_edges.setdefault(edge.sourceNode.id, []).append(edge)
+        self._in_edges.setdefault(edge.targetNode.id, []).append(edge)
+        self._change_degree(edge.sourceNode, 1)
+        self._change_degree(edge.targetNode, 1)
+        self._index_element(self._edge_index, edge)
+        object.__setattr__(edge, '_graph', self)
         return edge
 
     def add_new_edge(self, source_node, target_node, directed=False, **properties):
         edge = Edge(source_node, target_node, directed, **properties)
         return self.add_edge(edge)
 
+    def remove_edge(self, edge):
+        if edge is None or edge not in self._edge_order:
+            return
+        del self._edge_order[edge]
+        self._edge_list = None
+        self._unlink_edge(edge)
+
     def remove_edges_by_node(self, node):
-        # edgesToRemove = []
-        for edge in self.edges:
-            if edge.sourceNode == node or edge.targeteNode == node:
-                self.edges.remove(edge)
-                # edgesToRemove.append(node)
-        # self.edges.remove(edgesToRemove)
+        for edge in self.get_incident_edges(node):
+            self.remove_edge(edge)
+
+    def _unlink_edge(self, edge):
+        """Drops an edge from the incidence lists of both of its end nodes."""
+        self.version = self.version + 1
+        out_edges = self._out_edges.get(edge.sourceNode.id)
+        if out_edges is not None and edge in out_edges:
+            out_edges.remove(edge)
+        in_edges = self._in_edges.get(edge.targetNode.id)
+        if in_edges is not None and edge in in_edges:
+            in_edges.remove(edge)
+        self._change_degree(edge.sourceNode, -1)
+        self._change_degree(edge.targetNode, -1)
+        self._unindex_element(self._edge_index, edge)
+        object.__setattr__(edge, '_graph', None)
+
+    def _change_degree(self, node, delta):
+        degree = self._degrees.get(node.id, 0) + delta
+        self._degrees[node.id] = degree
+        if self._nodes_by_id.get(node.id) is node:
+            self._degree_statistics.change(degree - delta, degree)
+        node.update_properties(edge_count=degree)
+        self._update_single_edge_state(node)
+
+    def _update_single_edge_state(self, node):
+        degree = self._degrees.get(node.id, 0)
+        if degree == 1 or (degree > 1 and node.id in self.pinned_node_ids):
+            if node.id not in self._single_edge_nodes:
+                self._single_edge_nodes[node.id] = node
+        else:
+            self._single_edge_nodes.pop(node.id, None)
+
+    def get_degree(self, node):
+        """Returns the number of edges touching the node (self loops count twice)."""
+        return self._degrees.get(node.id, 0)
+
+    def set_pinned_node_ids(self, pinned_node_ids):
+        """Defines the nodes that are placed like single edge nodes regardless of their degree.
+
+        >>> graph = Graph()
+        >>> a, b, c = graph.add_new_node(1), graph.add_new_node(2), graph.add_new_node(3)
+        >>> e1, e2 = graph.add_new_edge(a, b), graph.add_new_edge(a, c)
+        >>> [n.id for n in graph.get_single_edge_nodes()]
+        [2, 3]
+        >>> graph.set_pinned_node_ids({1})
+        >>> [n.id for n in graph.get_single_edge_nodes()]
+        [2, 3, 1]
+        >>> graph.remove_edge(e2)
+        >>> [n.id for n in graph.get_single_edge_nodes()], graph.get_degree(a)
+        ([2, 1], 1)
+        """
+        changed = self.pinned_node_ids.symmetric_difference(pinned_node_ids)
+        self.pinned_node_ids = set(pinned_node_ids)
+        self.version = self.version + 1
+        for id in changed:
+            node = self.find_node_by_id(id)
+            if node is not None:
+                self._update_single_edge_state(node)
 
     def add_new_edge_by_ids(self, source_node_name, target_node_name, directed=False, **properties):
         src = self.find_node_by_id(source_node_name)
@@ -74,157 +237,485 @@ class Graph(object):
         return self.edges
 
     def find_node_by_id(self, id):
-        for node in self.nodes:
-            if node.id == id:
-                return node
-        return None
+        return self._nodes_by_id.get(id)
+
+    def get_out_edges(self, node):
+        """Returns the edges whose source is the given node, in O(out-degree)."""
+        return list(self._out_edges.get(node.id, ()))
+
+    def get_in_edges(self, node):
+        """Returns the edges whose target is the given node, in O(in-degree)."""
+        return list(self._in_edges.get(node.id, ()))
+
+    def get_incident_edges(self, node):
+        """Returns all edges touching the given node, in O(degree).
+
+        A self loop is only returned once.
+
+        >>> graph = Graph()
+        >>> a, b, c = graph.add_new_node(1), graph.add_new_node(2), graph.add_new_node(3)
+        >>> e1 = graph.add_new_edge(a, b, True, relation='killed')
+        >>> e2 = graph.add_new_edge(c, a, False, relation='sibling')
+        >>> [e.get('relation') for e in graph.get_incident_edges(a)]
+        ['killed', 'sibling']
+        >>> [n.id for n in graph.get_neighbours_of(a)]
+        [2, 3]
+        >>> graph.remove_node(b)
+        >>> [e.get('relation') for e in graph.edges]
+        ['sibling']
+        """
+        out_edges = self._out_edges.get(node.id, ())
+        in_edges = self._in_edges.get(node.id, ())
+        return list(out_edges) + [e for e in in_edges if e.sourceNode.id != node.id]
+
+    @staticmethod
+    def _index_element(index, element):
+        for (key, postings) in index.items():
+            value = element.get(key)
+            if value is not None:
+                postings.setdefault(value, dict())[element] = None
+
+    @staticmethod
+    def _unindex_element(index, element, key=None, value=None):
+        """Removes the element from all indexes, or only from the posting of key=value."""
+        items = index.items() if key is None else [(key, index[key])]
+        for (key, postings) in items:
+            if value is None:
+                current = element.get(key)
+            else:
+                current = value
+            posting = postings.get(current)
+            if posting is not None:
+                posting.pop(element, None)
+                if not posting:
+                    del postings[current]
+
+    def _element_changed(self, element, key, old_value, new_value):
+        """Called by nodes and edges of this graph whenever one of their properties changes."""
+        if key in LAYOUT_FIELDS and isinstance(element, Node):
+            self.layout_version = self.layout_version + 1
+            return
+        self.version = self.version + 1
+        index = self._node_index if isinstance(element, Node) else self._edge_index
+        if key in index and old_value != new_value:
+            if old_value is not None:
+                self._unindex_element(index, element, key, old_value)
+            if new_value is not None:
+                index[key].setdefault(new_value, dict())[element] = None
+
+    def query_nodes(self, **properties):
+        """Returns the nodes having all given properties (connected by AND).
+
+        Indexed properties are answered from the hash indexes, starting with the
+        smallest posting; the remaining properties are checked on the candidates.
+
+        >>> graph = Graph()
+        >>> n1 = graph.add_new_node(1, status='Alive', **{'house-birth': 'House Stark'})
+        >>> n2 = graph.add_new_node(2, status='Deceased', **{'house-birth': 'House Stark'})
+        >>> n3 = graph.add_new_node(3, status='Deceased', **{'house-birth': 'House Tully'})
+        >>> [n.id for n in graph.query_nodes(status='Deceased', **{'house-birth': 'House Stark'})]
+        [2]
+        >>> n1.update_properties(status='Deceased')
+        >>> [n.id for n in graph.query_nodes(status='Deceased')]
+        [2, 3, 1]
+        >>> graph.remove_node(n2)
+        >>> [n.id for n in graph.query_nodes(**{'house-birth': 'House Stark'})]
+        [1]
+        """
+        return self._query(self.nodes, self._node_index, properties)
 
-    def sort_nodes_by_property(self, property_name):
-        self.nodes.sort(key=lambda node: str(getattr(node, property_name, '')))
+    def query_edges(self, **properties):
+        """Returns the edges having all given properties (connected by AND), see query_nodes."""
+        return self._query(self.edges, self._edge_index, properties)
 
-    def load(self, path):
-        # Parse graphml
-        e = xml.etree.ElementTree.parse(path)
+    @staticmethod
+    def _query(elements, index, properties):
+        postings = []
+        remaining_properties = dict()
+        for (key, value) in properties.items():
+            if key in index and value is not None:
+                posting = index[key].get(value)
+                if not posting:
+                    return []
+                postings.append(posting)
+            else:
+                remaining_properties[key] = value
+
+        if not postings:
+            return [e for e in elements if e.fulfills_all_properties(**remaining_properties)]
+
+        postings.sort(key=len)
+        smallest = postings[0]
+        others = postings[1:]
+        result = []
+        for element in smallest:
+            if all(element in posting for posting in others) and \
+                    element.fulfills_all_properties(**remaining_properties):
+                result.append(element)
+        return result
 
-        # Build the graph
-        # iterate all nodes
-        for x in e.find("graph").findall("node"):
-            id = int(x.attrib["id"])
-            properties = dict()
+    def iter_bfs(self, node, relations=None, directed=False, max_depth=None):
+        """Yields (node, depth, edge) in breadth first order from the given node
+        (see traversal.bfs).
 
-            for data in x.findall("data"):
-                k = data.get("key")
-                v = data.text
-                properties[k] = v
+        :param relations: The relation (or relations) of the edges to follow, None for all.
+        :param directed: Whether directed edges can only be walked from source to target.
+        :param max_depth: The number of hops to go at most, None for no limit.
+        """
+        return traversal.bfs(self, node, traversal.relation_set(relations), directed, max_depth)
 
-            node = Node(id, **properties)
-            self.add_node(node)
+    def shortest_path(self, source, target, relations=None, directed=False):
+        """Returns the edges of a shortest path from source to target, None if there is none.
 
-        # iterate all edges
-        for x in e.find("graph").findall("edge"):
-            # all edges are directed by default, else attribute directed="false" is attached
-            # all edges have an element <data key="relation">...</data>
-            src = self.find_node_by_id(int(x.attrib["source"]))
-            trgt = self.find_node_by_id(int(x.attrib["target"]))
+        The results of the traversal queries are cached until the graph changes.
 
-            properties = dict()
-            for d in x.findall("data"):
-                # k = x.findall("data")[0].get("key")
-                # v = x.findall("data")[0].text
-                k = d.attrib["key"]
-                v = d.text
-                properties[k] = v
+        >>> graph = Graph()
+        >>> a, b, c, d = [graph.add_new_node(i) for i in (1, 2, 3, 4)]
+        >>> e1 = graph.add_new_edge(a, b, False, relation='sibling')
+        >>> e2 = graph.add_new_edge(c, b, True, relation='father')
+        >>> e3 = graph.add_new_edge(c, d, True, relation='killed')
+        >>> [e.relation for e in graph.shortest_path(a, d)]
+        ['sibling', 'father', 'killed']
+        >>> graph.shortest_path(a, d, directed=True) is None
+        True
+        >>> graph.shortest_path(a, d, relations=('sibling', 'father')) is None
+        True
+        >>> e4 = graph.add_new_edge(a, d, False, relation='lover')
+        >>> [e.relation for e in graph.shortest_path(a, d)]
+        ['lover']
 
-            directed = x.get("directed") != "false"
+        :param relations: The relation (or relations) of the edges to follow, None for all.
+        :param directed: Whether directed edges can only be walked from source to target.
+        """
+        relations = traversal.relation_set(relations)
+        path = self._traversal_cache.get_or_compute(
+            self.version, ("path", source.id, target.id, relations, directed),
+            lambda: traversal.shortest_path(self, source, target, relations, directed))
+        return None if path is None else list(path)
+
+    def get_neighbourhood_of(self, node, k=1, relations=None, directed=False):
+        """Returns the nodes at most k hops away from the given node (without it), nearest first.
+
+        >>> graph = Graph()
+        >>> a, b, c, d = [graph.add_new_node(i) for i in (1, 2, 3, 4)]
+        >>> edges = [graph.add_new_edge(a, b), graph.add_new_edge(b, c), graph.add_new_edge(c, d)]
+        >>> [n.id for n in graph.get_neighbourhood_of(b)]
+        [3, 1]
+        >>> [n.id for n in graph.get_neighbourhood_of(a, k=2)]
+        [2, 3]
+        """
+        relations = traversal.relation_set(relations)
+        return list(self._traversal_cache.get_or_compute(
+            self.version, ("neighbourhood", node.id, k, relations, directed),
+            lambda: tuple(n for (n, depth, e) in traversal.bfs(self, node, relations, directed, k)
+                          if n is not node)))
+
+    def get_connected_components(self, relations=None):
+        """Returns the nodes connected by edges of the given relations as one list per component.
+
+        >>> graph = Graph()
+        >>> a, b, c = [graph.add_new_node(i) for i in (1, 2, 3)]
+        >>> e1 = graph.add_new_edge(a, b, relation='sibling')
+        >>> e2 = graph.add_new_edge(b, c, relation='killed')
+        >>> [[n.id for n in component] for component in graph.get_connected_components('sibling')]
+        [[1, 2], [3]]
+        """
+        relations = traversal.relation_set(relations)
+        components = self._traversal_cache.get_or_compute(
+            self.version, ("components", relations),
+            lambda: tuple(tuple(component)
+                          for component in traversal.connected_components(self, relations)))
+        return [list(component) for component in components]
+
+    def view(self, node_filter=None, edge_filter=None):
+        """Returns a filtered GraphView of the graph that can be laid out and drawn like the graph.
+
+        >>> graph = Graph()
+        >>> a = graph.add_new_node(1, status='Alive')
+        >>> b = graph.add_new_node(2, status='Deceased')
+        >>> c = graph.add_new_node(3, status='Alive')
+        >>> e1 = graph.add_new_edge(a, b, relation='sibling')
+        >>> e2 = graph.add_new_edge(a, c, relation='father')
+        >>> [n.id for n in graph.view({'status': 'Alive'}).nodes]
+        [1, 3]
+        >>> from h3graph.views import property_not_in
+        >>> no_fathers = property_not_in('relation', 'father')
+        >>> [e.relation for e in graph.view(edge_filter=no_fathers).edges]
+        ['sibling']
+
+        :param node_filter: A predicate on nodes or a dict of the properties they have
+                            (see views.GraphView).
+        :param edge_filter: A predicate on edges or a dict of the properties they have.
+        """
+        import h3graph.views as views
+        return views.GraphView(self, node_filter, edge_filter)
 
-            edge = Edge(src, trgt, directed, **properties)
-            self.add_edge(edge)
+    def sort_nodes_by_property(self, property_name):
+        """Sorts the nodes by the string of a property, a change of their order is a change
+        of the graph.
+
+        >>> graph = Graph()
+        >>> a, b = graph.add_new_node(1, name='Sansa'), graph.add_new_node(2, name='Arya')
+        >>> version = graph.version
+        >>> graph.sort_nodes_by_property('name')
+        >>> [n.id for n in graph.nodes], graph.version == version + 1
+        ([2, 1], True)
+        >>> graph.sort_nodes_by_property('name')
+        >>> graph.version == version + 1
+        True
+        """
+        nodes = self.nodes
+        order = list(nodes)
+        nodes.sort(key=lambda node: str(getattr(node, property_name, '')))
+        if any(a is not b for (a, b) in zip(order, nodes)):
+            self._node_order = dict.fromkeys(nodes)
+            self.version = self.version + 1
 
-    def add_edge_count_to_nodes(self):
-        for e in self.edges:
-            for node in [e.sourceNode, e.targetNode]:
-                curr_edge_count = node.get("edge_count")
-                if curr_edge_count is None:
-                    node.update_properties(edge_count=1)
-                else:
-                    node.update_properties(edge_count=curr_edge_count + 1)
+    def load(self, path):
+        """Loads nodes and edges from a GraphML file.
 
-    def calc_statistics(self):
-        """place for calculating further properties of the graph"""
-        nb_edges = [n.edge_count for n in self.nodes]
-        self.max_edge_count = max(nb_edges)
-        print("max nb edges:", self.max_edge_count)
-        self.median_edge_count = statistics.median(nb_edges)
-        print("median nb edges:", self.median_edge_count)
-        self.mean_edge_count = statistics.mean(nb_edges)
-        print("mean nb edges:", self.mean_edge_count)
+        The file is streamed (see graphml.iter_graphml) and the values are converted
+        according to the attr.type of their <key> declaration.
 
-    def define_node_positions(self):
+        :param path: A file name or a binary file object.
+        """
+        with instrument.stage("load"):
+            # edges referring to nodes that have not been read yet are resolved at the end
+            pending_edges = []
+
+            for element in graphml.iter_graphml(path):
+                if element[0] == "node":
+                    (_, id, properties) = element
+                    self.add_node(Node(id, **properties))
+                else:
+                    (_, source_id, target_id, directed, properties) = element
+                    src = self.find_node_by_id(source_id)
+                    trgt = self.find_node_by_id(target_id)
+                    if src is None or trgt is None:
+                        pending_edges.append(element)
+                    else:
+                        self.add_edge(Edge(src, trgt, directed, **properties))
 
-        # Make house-birth characters neighbours
-        self.sort_nodes_by_property("house-birth")
+            for (_, source_id, target_id, directed, properties) in pending_edges:
+                self.add_new_edge_by_ids(source_id, target_id, directed, **properties)
 
-        # Find nodes that have a single edge only an reposition them:
-        single_edge_nodes = self.get_single_edge_nodes()
+        instrument.count("nodes", len(self.nodes))
+        instrument.count("edges", len(self.edges))
 
-        # Calculate counts on each circle
-        total_node_count = len(self.nodes)
-        main_circle_nodes = total_node_count - len(single_edge_nodes)
+    def save_snapshot(self, path, include_layout=True):
+        """Saves the graph in the binary snapshot format (see snapshot.Snapshot).
 
-        # calculate all possible circle positions
-        positions = calc.calc_positions(main_circle_nodes, draw.WIDTH_IN_MM, draw.HEIGHT_IN_MM, 400 * calc.POS_SCALE)
-        outer_circle_positions = calc.calc_positions(main_circle_nodes, draw.WIDTH_IN_MM, draw.HEIGHT_IN_MM, 450 * calc.POS_SCALE)
+        :param path: The file name.
+        :param include_layout: Whether the x and y coordinates of the nodes are saved.
+        """
+        import h3graph.snapshot as snapshot
+        snapshot.write_snapshot(self, path, include_layout)
+
+    def load_snapshot(self, path):
+        """Loads nodes and edges (and their layout, if saved) from a snapshot written by
+        save_snapshot.
+
+        Into an empty graph the snapshot is loaded in bulk: the degrees, the single edge
+        nodes, the incidence lists and the indexes are built from the columns at once
+        instead of being updated per node and edge. Otherwise the nodes and edges are
+        added one by one, replacing nodes with the same id (see add_node).
+
+        >>> import os, tempfile
+        >>> graph = Graph()
+        >>> a = graph.add_new_node(1, name='Arya', age=11)
+        >>> b = graph.add_new_node(2, name='Sansa')
+        >>> e = graph.add_new_edge(a, b, False, relation='sibling')
+        >>> a.x, a.y = 10.5, 20.0
+        >>> path = os.path.join(tempfile.mkdtemp(), 'graph.snapshot')
+        >>> graph.save_snapshot(path)
+        >>> loaded = Graph()
+        >>> loaded.load_snapshot(path)
+        >>> for n in loaded.nodes:
+        ...     print(n.get_properties())
+        {'id': 1, 'x': 10.5, 'y': 20.0, 'edge_count': 1, 'name': 'Arya', 'age': 11}
+        {'id': 2, 'edge_count': 1, 'name': 'Sansa'}
+        >>> [(e.sourceNode.id, e.targetNode.id, e.directed, e.relation) for e in loaded.edges]
+        [(1, 2, False, 'sibling')]
+        >>> [n.id for n in loaded.get_single_edge_nodes()], loaded.max_edge_count
+        ([1, 2], 1)
+        >>> [e.sourceNode.id for e in loaded.query_edges(relation='sibling')]
+        [1]
+        >>> c = loaded.add_new_node(3)
+        >>> e = loaded.add_new_edge(loaded.find_node_by_id(1), c)
+        >>> loaded.load_snapshot(path)
+        >>> [n.id for n in loaded.nodes], [n.edge_count for n in loaded.nodes], len(loaded.edges)
+        ([3, 1, 2], [0, 1, 1], 1)
+        """
+        import h3graph.snapshot as snapshot
+        with instrument.stage("load"), snapshot.Snapshot(path) as s:
+            ids = s.node_ids()
+            nodes = [Node(id) for id in ids]
+            node_columns = [(spec["key"], s.values(spec)) for spec in s.header["node_properties"]]
+            PropertyElement._load_columns(nodes, node_columns)
+            if s.has_column("node.x"):
+                for (node, x, y) in zip(nodes, s.column("node.x").tolist(),
+                                        s.column("node.y").tolist()):
+                    if x == x and y == y:  # NaN: no position
+                        object.__setattr__(node, 'x', x)
+                        object.__setattr__(node, 'y', y)
+
+            sources = s.column("edge.source").tolist()
+            targets = s.column("edge.target").tolist()
+            (degrees, touched) = snapshot.degrees(sources, targets, len(nodes))
+            edges = [Edge(nodes[source], nodes[target], bool(directed))
+                     for (source, target, directed) in zip(sources, targets,
+                                                           s.column("edge.directed").tolist())]
+            edge_columns = [(spec["key"], s.values(spec)) for spec in s.header["edge_properties"]]
+            PropertyElement._load_columns(edges, edge_columns)
+
+            if self._node_order or self._edge_order:
+                for node in nodes:
+                    self.add_node(node)
+                for edge in edges:
+                    self.add_edge(edge)
+            else:
+                self._add_loaded(nodes, edges, degrees, touched, node_columns, edge_columns)
+            self.layout_version = self.layout_version + 1
+
+        instrument.count("nodes", len(self.nodes))
+        instrument.count("edges", len(self.edges))
+
+    def _add_loaded(self, nodes, edges, degrees, touched, node_columns, edge_columns):
+        """Fills the empty graph with the nodes and edges read by load_snapshot.
+
+        :param degrees: The degree of each node.
+        :param touched: The positions of the nodes having an edge, in order of their first edge.
+        :param node_columns: The (key, values) property columns of the nodes,
+                             the indexes are built from them.
+        :param edge_columns: The property columns of the edges.
+        """
+        self.version = self.version + 1
+        ids = [node.id for node in nodes]
+        self._node_order = dict.fromkeys(nodes)
+        self._node_list = None
+        self._edge_order = dict.fromkeys(edges)
+        self._edge_list = None
+        self._nodes_by_id = dict(zip(ids, nodes))
+        self._out_edges = dict((id, []) for id in ids)
+        self._in_edges = dict((id, []) for id in ids)
+        for edge in edges:
+            self._out_edges[edge.sourceNode.id].append(edge)
+            self._in_edges[edge.targetNode.id].append(edge)
+
+        self._degrees = dict(zip(ids, degrees))
+        self._degree_statistics = DegreeStatistics(degrees)
+        for (node, degree) in zip(nodes, degrees):
+            object.__setattr__(node, 'edge_count', degree)
+        # a node becomes a single edge node with its first edge, and only pinned ones stay it
+        self._single_edge_nodes = dict((ids[i], nodes[i]) for i in touched
+                                       if degrees[i] == 1 or ids[i] in self.pinned_node_ids)
+
+        for (index, elements, columns) in [(self._node_index, nodes, node_columns),
+                                           (self._edge_index, edges, edge_columns)]:
+            for (key, values) in columns:
+                if key in index:
+                    postings = index[key]
+                    for (element, value) in zip(elements, values):
+                        if value is not None:
+                            postings.setdefault(value, dict())[element] = None
+
+        for element in nodes + edges:
+            object.__setattr__(element, '_graph', self)
 
-        index = 0
+    def add_edge_count_to_nodes(self):
+        """Writes the degree of every node to its edge_count property.
+
+        The degrees are maintained on every edge insertion and removal,
+        so this only resynchronises nodes whose edge_count was overwritten.
+        """
         for node in self.nodes:
-            if node in single_edge_nodes:
-                continue
+            node.update_properties(edge_count=self.get_degree(node))
+
+    @property
+    def max_edge_count(self):
+        return self._degree_statistics.max()
+
+    @property
+    def median_edge_count(self):
+        return self._degree_statistics.median()
 
-            node.x = positions[index][0]
-            node.y = positions[index][1]
+    @property
+    def mean_edge_count(self):
+        return self._degree_statistics.mean()
 
-            index = index + 1
+    def calc_statistics(self):
+        """place for calculating further properties of the graph
+
+        The degree statistics are maintained on every edge insertion and removal,
+        max_edge_count, median_edge_count and mean_edge_count are always up to date.
+
+        >>> graph = Graph()
+        >>> a, b, c = graph.add_new_node(1), graph.add_new_node(2), graph.add_new_node(3)
+        >>> e1, e2 = graph.add_new_edge(a, b), graph.add_new_edge(a, c)
+        >>> graph.max_edge_count, graph.median_edge_count, graph.mean_edge_count
+        (2, 1, 1.3333333333333333)
+        >>> graph.remove_edge(e2)
+        >>> graph.max_edge_count, graph.median_edge_count
+        (1, 1)
+        >>> graph.remove_edge(e2)
+        >>> graph.max_edge_count, len(graph.edges)
+        (1, 1)
+        """
+        logger.info("max nb edges: %s, median nb edges: %s, mean nb edges: %s",
+                    self.max_edge_count, self.median_edge_count, self.mean_edge_count)
 
-        # positioning single edge nodes
-        for sen in single_edge_nodes:
-            neighbours = self.get_neighbours_of(sen)
-            if (len(neighbours) > 0):
-                (x, y) = calc.get_nearest_position(outer_circle_positions, neighbours[0].x, neighbours[0].y)
-                outer_circle_positions.remove((x, y))
-                sen.x = x
-                sen.y = y
+    def define_node_positions(self, layout="circular"):
+        """Sets the x and y coordinates of all nodes.
+
+        :param layout: The name of a layout engine ("circular" or "force") or an engine,
+                       i.e. any object with an apply(graph) method (see h3graph.layout).
+        """
+        from h3graph.layout import get_layout
+        with instrument.stage("define_node_positions"):
+            get_layout(layout).apply(self)
 
     def get_single_edge_nodes(self):
-        nodeToEdgeCount = dict()
-
-        for e in self.edges:
-            for n in [e.sourceNode, e.targetNode]:
-                if e.targetNode.name == "Olly" or e.sourceNode.name == "Olly":
-                    nodeToEdgeCount[n] = 0
-                if e.targetNode.name == "Drogo" or e.sourceNode.name == "Drogo":
-                    nodeToEdgeCount[n] = 0
-                if e.targetNode.name == "Beric Dondarrion" or e.sourceNode.name == "Beric Dondarrion":
-                    nodeToEdgeCount[n] = 0
-                if e.targetNode.name == "Shae" or e.sourceNode.name == "Shae":
-                    nodeToEdgeCount[n] = 0
-                #if e.targetNode.name == "Night King" or e.sourceNode.name == "Night King":
-                #    nodeToEdgeCount[n] = 0
-                if e.targetNode.name == "Alliser Thorne" or e.sourceNode.name == "Alliser Thorne":
-                    nodeToEdgeCount[n] = 0
-                currentCount = nodeToEdgeCount.get(n)
-                if currentCount is None:
-                    currentCount = 0
-                currentCount = currentCount + 1
-                nodeToEdgeCount[n] = currentCount
-
-        resultList = []
-
-        for key in nodeToEdgeCount:
-            if nodeToEdgeCount[key] == 1:
-                resultList.append(key)
-
-        return resultList
+        """Returns the nodes with a single edge (and the pinned nodes),
+        in order of their first edge."""
+        return list(self._single_edge_nodes.values())
+
+    def is_single_edge_node(self, node):
+        return self._single_edge_nodes.get(node.id) is node
 
     def get_neighbours_of(self, node):
         result = []
-        for e in self.edges:
-            if e.sourceNode == node or e.targetNode == node:
-                if e.sourceNode != node:
-                    result.append(e.sourceNode)
-                if e.targetNode != node:
-                    result.append(e.targetNode)
+        for e in self.get_incident_edges(node):
+            if e.sourceNode != node:
+                result.append(e.sourceNode)
+            if e.targetNode != node:
+                result.append(e.targetNode)
         return result
 
     def update_graph(self):
         """executes all manipulating functions"""
-        self.add_edge_count_to_nodes()
-        self.calc_statistics()
+        with instrument.stage("update_graph"):
+            self.add_edge_count_to_nodes()
+            self.calc_statistics()
+
+    def draw(self, output="res.svg", cache=None, image_hrefs=None):
+        import h3graph.draw as draw
+        with instrument.stage("draw"):
+            draw.draw_graph(self, output, cache, image_hrefs)
+
+    def draw_tiles(self, directory, zoom_levels=None, image_hrefs=None):
+        """Draws the graph as tiles at several zoom levels into directory (see tiles.draw_tiles),
+        None for tiles.ZOOM_LEVELS levels."""
+        import h3graph.tiles as tiles
+        with instrument.stage("draw_tiles"):
+            tiles.draw_tiles(self, directory, zoom_levels or tiles.ZOOM_LEVELS,
+                             image_hrefs=image_hrefs)
 
-    def draw(self):
-        draw.draw_graph(self)
 
+class Node(PropertyElement):
 
-class Node(object):
+    __slots__ = ('id', 'x', 'y', 'edge_count')
+
+    CORE_FIELDS = __slots__
 
     def __init__(self, id, **properties):
         """Initializes a node/vertex.
@@ -248,14 +739,16 @@ class Node(object):
         If you want to load a dict:
         >>> properties =  {'status': 'Alive', 'width': 5}
         >>> node_3 = Node(3, **properties)
+
+        Nodes have no __dict__: id, x, y and edge_count are slots and all other
+        properties are stored compactly, strings as shared codes (see PropertyElement).
         """
+        self._init_properties(properties)
         self.id = id
-        for (key, value) in properties.items():
-            setattr(self, key, value)
 
     def __str__(self):
         return '{this_class}{properties}'.format(this_class=self.__class__,
-                                                 properties=self.__dict__)
+                                                 properties=self.get_properties())
 
     def update_properties(self, **properties):
         """Update or insert a new property of an edge.
@@ -265,16 +758,14 @@ class Node(object):
         The following command updates the status and adds a new properties:
         >>> node_1 = Node(1, status='Alive', width=5)
         >>> node_1.update_properties(status='Alive', width=66, color='blue')
-        >>> node_1.__dict__
+        >>> node_1.get_properties()
         {'id': 1, 'status': 'Alive', 'width': 66, 'color': 'blue'}
         """
         for (key, value) in properties.items():
             setattr(self, key, value)
 
     def get(self, key):
-        if hasattr(self, key):
-            return getattr(self, key)
-        return None
+        return self._get_property(key, None)
 
     def fulfills_all_properties(self, **properties):
         """
@@ -290,7 +781,8 @@ class Node(object):
         True
         >>> node.fulfills_all_properties(status='Deceased', group='Brotherhood Without Banners')
         False
-        >>> node.fulfills_all_properties(status='Alive', group='Brotherhood Without Banners', name='Drogon')
+        >>> node.fulfills_all_properties(status='Alive', group='Brotherhood Without Banners',
+        ...                              name='Drogon')
         False
         >>> properties =  {'id': 1, 'house-birth': 'House Clegane', 'width': 66}
         >>> node = Node(**properties)
@@ -298,14 +790,14 @@ class Node(object):
         >>> node.fulfills_all_properties(**property)
         True
         """
-        curr_properties = self.__dict__
-        for (key, value) in properties.items():
-            if key not in curr_properties or value != curr_properties[key]:
-                return False
-        return True
+        return self._has_all_properties(properties)
 
 
-class Edge(object):
+class Edge(PropertyElement):
+
+    __slots__ = ('sourceNode', 'targetNode', 'directed')
+
+    CORE_FIELDS = __slots__
 
     def __init__(self, source_node, target_node, directed=False, **properties):
         """Initializes an edge.
@@ -325,16 +817,15 @@ class Edge(object):
         >>> edge_1_2.relation
         'killed'
         """
+        self._init_properties(properties)
         self.sourceNode = source_node
         self.targetNode = target_node
         self.directed = directed
-        for (key, value) in properties.items():
-            setattr(self, key, value)
 
     def __str__(self):
         # TODO(gitdown) return node ids of source and target nodes.
         return '{this_class}{properties}'.format(this_class=self.__class__,
-                                                 properties=self.__dict__)
+                                                 properties=self.get_properties())
 
     def score_relevance(self, max, median):
         source_node = self.sourceNode
@@ -367,9 +858,7 @@ class Edge(object):
             setattr(self, key, value)
 
     def get(self, key):
-        if hasattr(self, key):
-            return getattr(self, key)
-        return None
+        return self._get_property(key, None)
 
     def fulfills_all_properties(self, **properties):
         """
@@ -391,8 +880,11 @@ class Edge(object):
         False
 
         """
-        curr_properties = self.__dict__
-        for (key, value) in properties.items():
-            if key not in curr_properties or value != curr_properties[key]:
-                return False
-        return True
+        return self._has_all_properties(properties)
+
+
+def __getattr__(name):
+    # h3graph.draw and the other LAZY_SUBMODULES, imported when they are first accessed
+    if name in LAZY_SUBMODULES:
+        return importlib.import_module("h3graph." + name)
+    raise AttributeError("module 'h3graph' has no attribute %r" % name)
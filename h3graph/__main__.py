@@ -0,0 +1,3 @@
+from h3graph.cli import main
+
+main()
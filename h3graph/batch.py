@@ -0,0 +1,237 @@
+"""Renders several filtered variants of one graph, e.g. one poster per house, in worker processes.
+
+    $ python -m h3graph.batch got.graphml --per-node house-birth --per-edge relation \
+          --output-dir posters
+    $ python -m h3graph.batch got.graphml --variants variants.json
+
+A variants file is a JSON list of objects with the keys
+    output:         the svg file
+    nodes, edges:   properties the nodes (edges) must have; a list of values means any of them
+    exclude_nodes, exclude_edges:
+                    properties the nodes (edges) must not have, as lists of values
+    layout:         lay the variant out on its own ("circular" or "force") instead of
+                    keeping the positions of the whole graph
+"""
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import pickle
+import re
+
+import h3graph
+import h3graph.draw as draw
+import h3graph.instrument as instrument
+from h3graph.views import GraphView, PropertyFilter
+
+# the graph, its images and the variants, set in every worker process by init_worker
+_worker_state = None
+
+
+class Variant(object):
+
+    def __init__(self, output, node_filters=(), edge_filters=(), layout=None):
+        """One output of a batch: the view of the graph given by the filters, drawn to output.
+
+        :param output: The svg file.
+        :param node_filters: Predicates or property dicts the nodes must pass (see GraphView).
+                             They are sent to worker processes, so they have to be picklable:
+                             dicts, views.PropertyFilter or module level functions.
+        :param edge_filters: Likewise for the edges.
+        :param layout: A layout for this variant only, None keeps the positions of the graph.
+        """
+        self.output = output
+        self.node_filters = list(node_filters)
+        self.edge_filters = list(edge_filters)
+        self.layout = layout
+
+    @staticmethod
+    def from_dict(spec):
+        """A variant from its description in a variants file (see the module documentation).
+
+        >>> variant = Variant.from_dict({'output': 'a.svg', 'nodes': {'status': 'Alive'},
+        ...                              'exclude_edges': {'relation': ['father', 'mother']}})
+        >>> [type(f).__name__ for f in variant.node_filters + variant.edge_filters]
+        ['dict', 'PropertyFilter']
+        """
+        node_filters = filters_from_spec(spec.get("nodes", dict()),
+                                         spec.get("exclude_nodes", dict()))
+        edge_filters = filters_from_spec(spec.get("edges", dict()),
+                                         spec.get("exclude_edges", dict()))
+        return Variant(spec["output"], node_filters, edge_filters, spec.get("layout"))
+
+    def view(self, graph):
+        view = GraphView(graph)
+        for node_filter in self.node_filters:
+            view = view.filter(node_filter=node_filter)
+        for edge_filter in self.edge_filters:
+            view = view.filter(edge_filter=edge_filter)
+        return view
+
+
+def filters_from_spec(include, exclude):
+    # single values are looked up in the property indexes, lists become PropertyFilters
+    equal = dict((key, value) for (key, value) in include.items() if not isinstance(value, list))
+    filters = [equal] if equal else []
+    filters.extend(PropertyFilter(key, values)
+                   for (key, values) in include.items() if isinstance(values, list))
+    filters.extend(PropertyFilter(key, values, include=False) for (key, values) in exclude.items())
+    return filters
+
+
+def file_name(key, value):
+    """A file name for the variant of a property value.
+
+    >>> file_name('house-birth', 'House Stark')
+    'house-birth-house-stark.svg'
+    """
+    return re.sub(r"[^a-z0-9]+", "-", ("%s-%s" % (key, value)).lower()).strip("-") + ".svg"
+
+
+def variants_per_node_property(graph, key, output_dir="."):
+    """One variant per value of a node property: its nodes and the edges between them."""
+    values = sorted(set(n.get(key) for n in graph.nodes if n.get(key) is not None), key=str)
+    return [Variant(os.path.join(output_dir, file_name(key, value)), node_filters=[{key: value}])
+            for value in values]
+
+
+def variants_per_edge_property(graph, key, output_dir="."):
+    """One variant per value of an edge property: all nodes, but only the edges with the value."""
+    values = sorted(set(e.get(key) for e in graph.edges if e.get(key) is not None), key=str)
+    return [Variant(os.path.join(output_dir, file_name(key, value)), edge_filters=[{key: value}])
+            for value in values]
+
+
+def process_pool(workers, initializer, initargs):
+    """A pool of worker processes set up by initializer(*initargs).
+
+    Forked workers inherit the arguments (the graph, its layout and the images) from this
+    process, other start methods pickle them once per worker.
+
+    :param workers: The number of worker processes, None for one per CPU.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                  initializer=initializer, initargs=initargs)
+
+
+def init_worker(graph, image_hrefs, variants):
+    global _worker_state
+    _worker_state = (graph, image_hrefs, variants)
+
+
+def draw_variant(graph, variant, output, image_hrefs):
+    """Draws the view of a variant to output, a file name or a writable text stream.
+
+    A variant with a layout of its own is laid out on a copy of the graph: the graph is
+    shared with the following drawings of a worker, moving its nodes would change their
+    positions and the layout_version of the graph (the cache key of the render service).
+    """
+    if variant.layout is not None:
+        graph = pickle.loads(pickle.dumps(graph, pickle.HIGHEST_PROTOCOL))
+    view = variant.view(graph)
+    if variant.layout is not None:
+        view.define_node_positions(variant.layout)
+    view.draw(output, image_hrefs=image_hrefs)
+
+
+def render_variant(index):
+    """Renders the variant with the given index, in a worker set up by init_worker."""
+    (graph, image_hrefs, variants) = _worker_state
+    variant = variants[index]
+    draw_variant(graph, variant, variant.output, image_hrefs)
+    return variant.output
+
+
+def render_variants(graph, variants, workers=None, processes=True):
+    """Draws the variants of a laid out graph.
+
+    The images are loaded once. The variants are drawn in parallel by worker processes;
+    where processes are forked they share the graph, its layout and the images with this
+    process instead of receiving a copy. A variant with a layout of its own leaves the
+    positions of the graph as they were for the variants drawn after it.
+
+    >>> import pathlib, tempfile
+    >>> graph = h3graph.Graph()
+    >>> nodes = [graph.add_new_node(i, status='Alive' if i % 2 else 'Deceased')
+    ...          for i in range(1000, 1008)]
+    >>> for (a, b) in zip(nodes, nodes[1:] + nodes[:1]):
+    ...     edge = graph.add_new_edge(a, b, relation='sibling')
+    >>> graph.define_node_positions('circular')
+    >>> graph.update_graph()
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     (alone, force, after) = [os.path.join(directory, name + '.svg')
+    ...                              for name in ('alone', 'force', 'after')]
+    ...     outputs = render_variants(graph, [Variant(alone)], processes=False)
+    ...     outputs = render_variants(graph, [Variant(force, layout='force'), Variant(after)],
+    ...                               processes=False)
+    ...     pathlib.Path(after).read_text() == pathlib.Path(alone).read_text()
+    True
+
+    :param graph: The graph, with node positions.
+    :param variants: The variants.
+    :param workers: The number of worker processes, None for one per CPU.
+    :param processes: Whether to use worker processes, the variants are drawn one after
+                      another in this process otherwise.
+    :return: The output files, in the order of variants.
+    """
+    with instrument.stage("load_images"):
+        image_hrefs = draw.load_character_images(graph, draw.IMAGE_SIZE, draw.IMAGE_WORKERS,
+                                                 draw.IMAGE_PROCESSES)
+    for variant in variants:
+        directory = os.path.dirname(variant.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    if not processes or len(variants) <= 1:
+        init_worker(graph, image_hrefs, variants)
+        return [render_variant(i) for i in range(0, len(variants))]
+
+    with process_pool(workers, init_worker, (graph, image_hrefs, variants)) as executor:
+        return list(executor.map(render_variant, range(0, len(variants))))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Draws filtered variants of a graph to several svg files.")
+    parser.add_argument("graph", help="the GraphML file")
+    parser.add_argument("--variants",
+                        help="a JSON file with the variants (see the module documentation)")
+    parser.add_argument("--per-node", metavar="PROPERTY", action="append", default=[],
+                        help="one variant per value of a node property, e.g. house-birth or status")
+    parser.add_argument("--per-edge", metavar="PROPERTY", action="append", default=[],
+                        help="one variant per value of an edge property, e.g. relation")
+    parser.add_argument("--output-dir", default=".",
+                        help="where the --per-node and --per-edge variants are written")
+    parser.add_argument("--layout", default="circular",
+                        help="the layout of the whole graph (circular or force)")
+    parser.add_argument("--pin", metavar="ID", type=int, action="append", default=[],
+                        help="a node placed on the outer circle although it has more than one edge")
+    parser.add_argument("--workers", type=int,
+                        help="the number of worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    graph = h3graph.Graph(pinned_node_ids=args.pin)
+    graph.load(args.graph)
+    graph.define_node_positions(args.layout)
+    graph.update_graph()
+
+    variants = []
+    if args.variants is not None:
+        with open(args.variants) as f:
+            variants.extend(Variant.from_dict(spec) for spec in json.load(f))
+    for key in args.per_node:
+        variants.extend(variants_per_node_property(graph, key, args.output_dir))
+    for key in args.per_edge:
+        variants.extend(variants_per_edge_property(graph, key, args.output_dir))
+    if not variants:
+        parser.error("no variants given, use --variants, --per-node or --per-edge")
+
+    for output in render_variants(graph, variants, args.workers):
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -26,8 +26,6 @@ def calc_positions(count, doc_width, doc_height, r = None):
         x = (r * math.cos(radiant)) + center_x
         y = (r * math.sin(radiant)) + center_y
 
-        print(str(x) + ", " + str(y))
-
         positions.append((x, y))
 
     return positions
@@ -47,8 +45,6 @@ def calc_inner_circle_positions(count, doc_width, doc_height):
         x = (inner_circle_radius * math.cos(radiant)) + center_x
         y = (inner_circle_radius * math.sin(radiant)) + center_y
 
-        print(str(x) + ", " + str(y))
-
         positions.append((x, y))
 
     return positions
@@ -61,7 +57,7 @@ def get_nearest_position(positions, x, y):
 
     for position in positions:
         if nearest_posistion is None:
-            nearest_posistion = positions
+            nearest_posistion = position
             nearest_distance = distance(position, (x,y))
         else:
             dist = distance(position, (x,y))
@@ -72,6 +68,78 @@ def get_nearest_position(positions, x, y):
     return nearest_posistion
 
 
+class CircleSlots(object):
+
+    def __init__(self, count, doc_width, doc_height, r=None):
+        """The positions of calc_positions, handed out one by one to the nearest caller.
+
+        All slots lie on one circle, so the free slots nearest to a point are the
+        first free slot clockwise and counter-clockwise of the point's angle. Both
+        are found with union-find "next free" pointers, which makes every lookup and
+        removal amortised almost O(1) instead of scanning the remaining positions.
+
+        >>> slots = CircleSlots(4, 100, 100, r=10)
+        >>> [tuple(round(c) for c in p) for p in slots.positions]
+        [(187, 177), (177, 187), (167, 177), (177, 167)]
+        >>> tuple(round(c) for c in slots.take_nearest(190, 178))
+        (187, 177)
+        >>> tuple(round(c) for c in slots.take_nearest(190, 178))
+        (177, 187)
+        """
+        self.positions = calc_positions(count, doc_width, doc_height, r)
+        self.count = count
+        self.center_x = doc_width / 2 * POS_SCALE
+        self.center_y = doc_height / 2 * POS_SCALE
+        self.free_count = count
+
+        # _next[i] leads to the first free slot >= i (count: none left),
+        # _prev[i + 1] leads to the last free slot <= i (0: none left).
+        self._next = list(range(0, count + 1))
+        self._prev = list(range(0, count + 1))
+
+    @staticmethod
+    def _find(parents, i):
+        root = i
+        while parents[root] != root:
+            root = parents[root]
+        # path compression
+        while parents[i] != root:
+            parents[i], i = root, parents[i]
+        return root
+
+    def _next_free(self, i):
+        found = self._find(self._next, i)
+        if found == self.count:
+            found = self._find(self._next, 0)  # wrap around
+        return found
+
+    def _prev_free(self, i):
+        found = self._find(self._prev, i + 1) - 1
+        if found < 0:
+            found = self._find(self._prev, self.count) - 1  # wrap around
+        return found
+
+    def take(self, index):
+        """Marks a slot as used and returns its position."""
+        self._next[index] = index + 1
+        self._prev[index + 1] = index
+        self.free_count = self.free_count - 1
+        return self.positions[index]
+
+    def take_nearest(self, x, y):
+        """Returns and removes the free position nearest to x,y (None if all are taken)."""
+        if self.free_count == 0:
+            return None
+
+        angle = math.atan2(y - self.center_y, x - self.center_x) % (2.0*math.pi)
+        index = int(angle / (2.0*math.pi) * self.count) % self.count
+
+        # the point lies between the slots index and index + 1
+        candidates = sorted({self._prev_free(index), self._next_free((index + 1) % self.count)})
+        nearest = min(candidates, key=lambda i: distance(self.positions[i], (x, y)))
+        return self.take(nearest)
+
+
 # calculates a distance without using the root
 def distance(p1, p2):
     return math.pow(p1[0] - p2[0], 2) + math.pow(p1[1] - p2[1], 2)
@@ -0,0 +1,215 @@
+import random
+
+import numpy as np
+
+# betweenness of larger graphs is estimated from this many random BFS sources
+BETWEENNESS_SAMPLE_SIZE = 500
+
+# measures relevant_edges can highlight edges by
+RELEVANCE_MEASURES = ("degree", "betweenness", "pagerank")
+
+
+class Adjacency(object):
+
+    def __init__(self, graph, directed=False):
+        """The graph in compressed sparse row form: the neighbours of node i are
+        indices[indptr[i]:indptr[i + 1]], reached through the edges edge_ids[...]
+        (positions in graph.edges).
+
+        :param graph: The graph.
+        :param directed: Whether directed edges are only followed from source to target.
+                         Undirected edges are always followed both ways.
+        """
+        self.nodes = list(graph.nodes)
+        index = dict((node.id, i) for (i, node) in enumerate(self.nodes))
+        edges = graph.edges
+        count = len(edges)
+
+        sources = np.fromiter((index[e.sourceNode.id] for e in edges), dtype=np.int64, count=count)
+        targets = np.fromiter((index[e.targetNode.id] for e in edges), dtype=np.int64, count=count)
+        edge_ids = np.arange(count)
+        self.sources = sources
+        self.targets = targets
+
+        # every edge is an arc source -> target,
+        # arcs back are added where it may be walked in reverse
+        if directed:
+            backwards = np.fromiter((not e.directed for e in edges), dtype=bool, count=count)
+        else:
+            backwards = np.ones(count, dtype=bool)
+        arc_sources = np.concatenate((sources, targets[backwards]))
+        arc_targets = np.concatenate((targets, sources[backwards]))
+        arc_edges = np.concatenate((edge_ids, edge_ids[backwards]))
+
+        order = np.argsort(arc_sources, kind="stable")
+        self.indices = arc_targets[order]
+        self.edge_ids = arc_edges[order]
+        self.indptr = np.zeros(len(self.nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(arc_sources, minlength=len(self.nodes)), out=self.indptr[1:])
+
+
+def brandes(adjacency, sources=None):
+    """Brandes' algorithm on an unweighted Adjacency, returns (node, edge) betweenness arrays.
+
+    Every shortest path between a pair of nodes is counted once per direction it is found in.
+    The BFS of every source runs level by level, all arcs leaving a level are handled at once.
+
+    :param sources: The nodes (indices) to start the BFS from, None for all of them.
+    """
+    n = len(adjacency.nodes)
+    m = len(adjacency.sources)
+    indptr = adjacency.indptr
+    indices = adjacency.indices
+    out_degree = np.diff(indptr)
+    node_scores = np.zeros(n)
+    edge_scores = np.zeros(m)
+
+    for s in (range(0, n) if sources is None else sources):
+        # BFS counting the shortest paths sigma, keeping the arcs on shortest paths per level
+        distance = np.full(n, -1, dtype=np.int64)
+        distance[s] = 0
+        sigma = np.zeros(n)
+        sigma[s] = 1.0
+        levels = []
+        frontier = np.array([s])
+        level = 0
+        while len(frontier) > 0:
+            counts = out_degree[frontier]
+            starts = indptr[frontier] - (np.cumsum(counts) - counts)
+            arcs = np.repeat(starts, counts) + np.arange(counts.sum())
+            tails = np.repeat(frontier, counts)
+            heads = indices[arcs]
+            distance[heads[distance[heads] < 0]] = level + 1
+            on_path = distance[heads] == level + 1
+            (tails, heads, arcs) = (tails[on_path], heads[on_path], arcs[on_path])
+            sigma = sigma + np.bincount(heads, weights=sigma[tails], minlength=n)
+            levels.append((tails, heads, adjacency.edge_ids[arcs]))
+            frontier = np.unique(heads)
+            level = level + 1
+
+        # accumulate the dependencies in order of decreasing distance
+        delta = np.zeros(n)
+        for (tails, heads, edges) in reversed(levels):
+            c = sigma[tails] / sigma[heads] * (1.0 + delta[heads])
+            edge_scores = edge_scores + np.bincount(edges, weights=c, minlength=m)
+            delta = delta + np.bincount(tails, weights=c, minlength=n)
+        delta[s] = 0.0
+        node_scores = node_scores + delta
+
+    return (node_scores, edge_scores)
+
+
+def betweenness(graph, directed=False, normalized=True, samples=None, seed=0):
+    """The betweenness centrality of all nodes and edges, (node id -> score, [score per edge]).
+
+    >>> import h3graph
+    >>> graph = h3graph.Graph()
+    >>> a, b, c = graph.add_new_node(1), graph.add_new_node(2), graph.add_new_node(3)
+    >>> e1, e2 = graph.add_new_edge(a, b), graph.add_new_edge(b, c)
+    >>> (nodes, edges) = betweenness(graph, normalized=False)
+    >>> nodes, edges
+    ({1: 0.0, 2: 1.0, 3: 0.0}, [2.0, 2.0])
+
+    :param directed: Whether directed edges are only walked from source to target.
+    :param normalized: Whether the scores are divided by the number of ordered node pairs.
+    :param samples: Estimate the scores from this many random BFS sources (all nodes if None
+                    or not less than the number of nodes), the result is scaled up accordingly.
+    :param seed: The seed of the source sample.
+    """
+    adjacency = Adjacency(graph, directed)
+    n = len(adjacency.nodes)
+    sources = None
+    scale = 1.0
+    if samples is not None and samples < n:
+        sources = random.Random(seed).sample(range(0, n), samples)
+        scale = n / samples
+
+    (node_scores, edge_scores) = brandes(adjacency, sources)
+    if normalized:
+        # by the number of ordered pairs (of nodes other than the one scored)
+        node_scores = node_scores * (scale / ((n - 1) * (n - 2)) if n > 2 else scale)
+        edge_scores = edge_scores * (scale / (n * (n - 1)) if n > 1 else scale)
+    elif not directed:
+        # every path has been found from both of its ends
+        node_scores = node_scores * (scale / 2)
+        edge_scores = edge_scores * (scale / 2)
+    else:
+        node_scores = node_scores * scale
+        edge_scores = edge_scores * scale
+
+    return (dict(zip((node.id for node in adjacency.nodes), node_scores.tolist())),
+            edge_scores.tolist())
+
+
+def pagerank(graph, damping=0.85, tolerance=1e-10, max_iterations=100, directed=True):
+    """The PageRank of all nodes by power iteration, node id -> score (the scores sum up to 1).
+
+    Nodes without outgoing arcs spread their rank over all nodes.
+
+    >>> import h3graph
+    >>> graph = h3graph.Graph()
+    >>> a, b, c = graph.add_new_node(1), graph.add_new_node(2), graph.add_new_node(3)
+    >>> e1, e2 = graph.add_new_edge(a, c, True), graph.add_new_edge(b, c, True)
+    >>> ranks = pagerank(graph)
+    >>> max(ranks, key=ranks.get), round(sum(ranks.values()), 6)
+    (3, 1.0)
+
+    :param damping: The probability of following an arc instead of jumping to a random node.
+    :param tolerance: Stop once the ranks change by less than this in total.
+    :param directed: Whether directed edges only pass rank from their source to their target.
+    """
+    adjacency = Adjacency(graph, directed)
+    n = len(adjacency.nodes)
+    if n == 0:
+        return dict()
+
+    arc_sources = np.repeat(np.arange(n), np.diff(adjacency.indptr))
+    out_degree = np.diff(adjacency.indptr).astype(float)
+    dangling = out_degree == 0
+    weights = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+
+    rank = np.full(n, 1.0 / n)
+    for i in range(0, max_iterations):
+        spread = np.bincount(adjacency.indices, weights=(rank * weights)[arc_sources], minlength=n)
+        new_rank = damping * (spread + rank[dangling].sum() / n) + (1.0 - damping) / n
+        change = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if change < tolerance:
+            break
+
+    return dict(zip((node.id for node in adjacency.nodes), rank.tolist()))
+
+
+def relevance_threshold(scores):
+    # like Edge.score_relevance: the middle of the maximum and the median
+    return (np.max(scores) + np.median(scores)) / 2
+
+
+def relevant_edges(graph, measure="degree"):
+    """Which edges of graph.edges (a Graph or GraphView) are highlighted as relevant (HiRel),
+    one bool per edge.
+
+    degree:      the mean degree of the end nodes is high (Edge.score_relevance)
+    betweenness: many shortest paths run through the edge
+    pagerank:    the mean PageRank of the end nodes is high
+
+    The centrality of large graphs is estimated (see BETWEENNESS_SAMPLE_SIZE).
+    """
+    if measure == "degree":
+        # Edge.score_relevance with the degrees within graph, which may be a GraphView
+        threshold = (graph.max_edge_count + graph.median_edge_count) / 2
+        return [(graph.get_degree(e.sourceNode) + graph.get_degree(e.targetNode)) / 2 > threshold
+                for e in graph.edges]
+    if not graph.edges:
+        return []
+    if measure == "betweenness":
+        (_, edge_scores) = betweenness(graph, normalized=False, samples=BETWEENNESS_SAMPLE_SIZE)
+        threshold = relevance_threshold(edge_scores)
+        return [score > threshold for score in edge_scores]
+    if measure == "pagerank":
+        ranks = pagerank(graph)
+        threshold = relevance_threshold(list(ranks.values()))
+        return [(ranks[e.sourceNode.id] + ranks[e.targetNode.id]) / 2 > threshold
+                for e in graph.edges]
+    raise ValueError("Unknown relevance measure: %s (expected one of %s)"
+                     % (measure, ", ".join(RELEVANCE_MEASURES)))
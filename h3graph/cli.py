@@ -0,0 +1,181 @@
+"""The command line interface, python -m h3graph COMMAND:
+
+    load FILE       loads a GraphML file or a snapshot, optionally saves it as snapshot
+    stats FILE      prints the size, the degree statistics and the components of the graph,
+                    optionally the most central characters
+    layout FILE     lays the graph out and saves it with the positions as snapshot
+    render FILE     draws the graph to an svg (or svgz) file or to tiles
+
+    $ python -m h3graph load got.graphml --snapshot got.snapshot
+    $ python -m h3graph stats got.snapshot --centrality pagerank
+    $ python -m h3graph layout got.snapshot --layout force -o got-force.snapshot
+    $ python -m h3graph render got-force.snapshot -o res.svgz --optimize
+
+Only render and layout import the rendering stack (svgwrite), so the other
+commands start quickly.
+"""
+import argparse
+import logging
+import os
+import sys
+
+import h3graph
+import h3graph.instrument as instrument
+
+# snapshot.MAGIC, repeated to tell the formats apart without importing numpy for GraphML files
+SNAPSHOT_MAGIC = b"H3GSNAP1"
+
+
+def is_snapshot(path):
+    with open(path, 'rb') as f:
+        return f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+
+def read_graph(path, pinned_node_ids=()):
+    """Loads a GraphML file or a snapshot (see Graph.save_snapshot), whichever path is."""
+    graph = h3graph.Graph(pinned_node_ids=pinned_node_ids)
+    if is_snapshot(path):
+        graph.load_snapshot(path)
+    else:
+        graph.load(path)
+    return graph
+
+
+def has_layout(graph):
+    return bool(graph.nodes) and all(n.get("x") is not None for n in graph.nodes)
+
+
+def load(args):
+    graph = read_graph(args.graph)
+    print("%d nodes, %d edges" % (len(graph.nodes), len(graph.edges)))
+    if args.snapshot is not None:
+        graph.save_snapshot(args.snapshot)
+
+
+def stats(args):
+    graph = read_graph(args.graph)
+    components = graph.get_connected_components()
+    print("nodes: %d" % len(graph.nodes))
+    print("edges: %d" % len(graph.edges))
+    print("degree: max %s, median %s, mean %.2f" % (graph.max_edge_count, graph.median_edge_count,
+                                                    graph.mean_edge_count))
+    print("single edge nodes: %d" % len(graph.get_single_edge_nodes()))
+    print("components: %d, the largest with %d nodes" % (len(components),
+                                                         max(map(len, components), default=0)))
+
+    if args.centrality is not None:
+        import h3graph.centrality as centrality
+        if args.centrality == "betweenness":
+            (scores, _) = centrality.betweenness(graph)
+        else:
+            scores = centrality.pagerank(graph)
+        print("%s:" % args.centrality)
+        ranking = sorted(graph.nodes, key=lambda n: -scores[n.id])
+        for n in ranking[:args.top]:
+            score = scores[n.id]
+            print("  %.4f  %s" % (score, n.get("name") if n.get("name") is not None else n.id))
+
+
+def layout(args):
+    graph = read_graph(args.graph, args.pin)
+    graph.define_node_positions(args.layout)
+    graph.save_snapshot(args.output, include_layout=True)
+
+
+def render(args):
+    import h3graph.draw as draw
+    draw.OPTIMIZE = args.optimize
+    draw.LABEL_PLACEMENT = args.place_labels
+    draw.HIGHLIGHT = args.highlight
+
+    graph = read_graph(args.graph, args.pin)
+    if args.layout is not None or not has_layout(graph):
+        graph.define_node_positions(args.layout or "circular")
+    graph.update_graph()
+    if args.tiles is not None:
+        graph.draw_tiles(args.tiles, args.zoom_levels)
+    else:
+        graph.draw(args.output)
+
+
+def parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-v", "--verbose", action="store_true",
+                        help="log the statistics, timings and counters of the stages")
+    common.add_argument("--profile", metavar="DIR",
+                        help="write a cProfile file <stage>.prof per stage to DIR")
+    common.add_argument("--trace-memory", action="store_true",
+                        help="log the memory peak of every stage")
+    common.add_argument("graph", help="a GraphML file or a snapshot")
+
+    result = argparse.ArgumentParser(prog="h3graph",
+                                     description="Loads, analyses, lays out and draws graphs.")
+    commands = result.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+
+    command = commands.add_parser("load", parents=[common], help="load a graph")
+    command.add_argument("--snapshot", metavar="FILE", help="save the graph as snapshot")
+    command.set_defaults(run=load)
+
+    command = commands.add_parser("stats", parents=[common], help="print statistics of a graph")
+    command.add_argument("--centrality", choices=("pagerank", "betweenness"),
+                         help="also print the most central nodes by this measure")
+    command.add_argument("--top", type=int, default=10,
+                         help="how many of them (default: %(default)s)")
+    command.set_defaults(run=stats)
+
+    for (name, run, help) in (("layout", layout, "lay a graph out and save it as snapshot"),
+                              ("render", render, "draw a graph")):
+        command = commands.add_parser(name, parents=[common], help=help)
+        command.add_argument("--pin", metavar="ID", type=int, action="append", default=[],
+                             help="a node placed on the outer circle "
+                                  "although it has more than one edge")
+        command.set_defaults(run=run)
+    layout_command = commands.choices["layout"]
+    layout_command.add_argument("--layout", default="circular",
+                                help="circular or force (default: %(default)s)")
+    layout_command.add_argument("-o", "--output", required=True, help="the snapshot file")
+
+    render_command = commands.choices["render"]
+    render_command.add_argument("--layout",
+                                help="circular or force (default: the positions of a snapshot "
+                                     "if it has them, circular otherwise)")
+    render_command.add_argument("-o", "--output", default="res.svg",
+                                help="the svg file, *.svgz files are gzip compressed "
+                                     "(default: %(default)s)")
+    render_command.add_argument("--optimize", action="store_true",
+                                help="write a smaller file: rounded coordinates and compact paths "
+                                     "(see draw.OPTIMIZE)")
+    render_command.add_argument("--place-labels", action="store_true",
+                                help="move the labels out of each other's way "
+                                     "(see draw.LABEL_PLACEMENT)")
+    render_command.add_argument("--highlight", default="degree",
+                                choices=("degree", "betweenness", "pagerank"),
+                                help="what makes an edge relevant (default: %(default)s)")
+    render_command.add_argument("--tiles", metavar="DIR",
+                                help="draw tiles to DIR instead (see tiles.draw_tiles)")
+    render_command.add_argument("--zoom-levels", type=int,
+                                help="the number of zoom levels of the tiles")
+    return result
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    if not (args.verbose or args.profile or args.trace_memory):
+        args.run(args)
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    instrumentation = instrument.Instrumentation(profile=args.profile is not None,
+                                                 trace_memory=args.trace_memory)
+    with instrument.enabled(instrumentation):
+        args.run(args)
+
+    if args.profile is not None:
+        os.makedirs(args.profile, exist_ok=True)
+        for (name, profiler) in instrumentation.profiles.items():
+            profiler.dump_stats(os.path.join(args.profile, name + ".prof"))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
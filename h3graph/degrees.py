@@ -0,0 +1,96 @@
+class DegreeStatistics(object):
+
+    def __init__(self, degrees=()):
+        """Max, median and mean of a multiset of node degrees, updated in O(log max degree).
+
+        The number of nodes per degree is kept in a Fenwick tree, so the k-th smallest
+        degree is found by descending the tree instead of sorting all degrees.
+        The results are the ones of max, statistics.median and statistics.mean.
+
+        >>> stats = DegreeStatistics([1, 4, 2, 4])
+        >>> stats.max(), stats.median(), stats.mean()
+        (4, 3.0, 2.75)
+        >>> stats.change(1, 7)
+        >>> stats.max(), stats.median(), stats.kth(0)
+        (7, 4.0, 2)
+        >>> stats.remove(4)
+        >>> stats.median()
+        4
+        """
+        self.count = 0
+        self.total = 0
+        self._tree = [0] * 16  # _tree[i] for 1-based i, degree d is stored at d + 1
+        for degree in degrees:
+            self.add(degree)
+
+    def _update(self, degree, delta):
+        i = degree + 1
+        if i >= len(self._tree):
+            self._grow(i)
+        while i < len(self._tree):
+            self._tree[i] = self._tree[i] + delta
+            i = i + (i & -i)
+
+    def _grow(self, i):
+        counts = [self._count_at(d) for d in range(0, len(self._tree) - 1)]
+        size = len(self._tree)
+        while size <= i:
+            size = size * 2
+        self._tree = [0] * size
+        for (degree, count) in enumerate(counts):
+            if count:
+                self._update(degree, count)
+
+    def _prefix(self, i):
+        result = 0
+        while i > 0:
+            result = result + self._tree[i]
+            i = i - (i & -i)
+        return result
+
+    def _count_at(self, degree):
+        return self._prefix(degree + 1) - self._prefix(degree)
+
+    def add(self, degree):
+        self._update(degree, 1)
+        self.count = self.count + 1
+        self.total = self.total + degree
+
+    def remove(self, degree):
+        self._update(degree, -1)
+        self.count = self.count - 1
+        self.total = self.total - degree
+
+    def change(self, old, new):
+        if old != new:
+            self.remove(old)
+            self.add(new)
+
+    def kth(self, k):
+        """The k-th smallest degree, counted from 0."""
+        if not 0 <= k < self.count:
+            raise IndexError("degree index out of range")
+        position = 0
+        step = 1
+        while step * 2 < len(self._tree):
+            step = step * 2
+        while step > 0:
+            if position + step < len(self._tree) and self._tree[position + step] <= k:
+                position = position + step
+                k = k - self._tree[position]
+            step = step // 2
+        return position  # the 1-based index position + 1 stores degree position
+
+    def max(self):
+        return self.kth(self.count - 1) if self.count else 0
+
+    def median(self):
+        if self.count == 0:
+            return 0
+        middle = self.count // 2
+        if self.count % 2 == 1:
+            return self.kth(middle)
+        return (self.kth(middle - 1) + self.kth(middle)) / 2
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
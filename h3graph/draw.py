@@ -1,7 +1,14 @@
+import hashlib
 import os
-import base64
 import svgwrite
 import h3graph.calc as calc
+import h3graph.centrality as centrality
+import h3graph.images as images
+import h3graph.instrument as instrument
+import h3graph.page as page
+from h3graph.geometry import EdgeGeometry
+from h3graph.labels import LabelPlacer, label_lines
+from h3graph.svgstream import FragmentRecorder, StreamingDrawing
 
 from svgwrite.shapes import Circle, Line
 from svgwrite.container import Group
@@ -15,22 +22,61 @@ from svgwrite.gradients import RadialGradient
 NO_PARENTS = False
 NO_SIBLINGS = False
 EXPERIMENTAL = False
+# what makes an edge relevant (HiRel): degree, betweenness or pagerank,
+# see centrality.relevant_edges
+HIGHLIGHT = "degree"
+# whether the labels are moved to free positions (see labels.LabelPlacer)
+# instead of always below their node
+LABEL_PLACEMENT = False
+# whether the output is written compactly: coordinates with PRECISION decimals, short path data and
+# no sizes on the references to the death symbol (they have no effect on a group);
+# outputs named *.svgz are gzip compressed in any case (see svgstream.StreamingDrawing)
+OPTIMIZE = False
+PRECISION = 2
 SCALE = 20
 POS_SCALE = 3.543307
-HEIGHT_IN_MM = 1189
-WIDTH_IN_MM = 841
+HEIGHT_IN_MM = page.HEIGHT_IN_MM
+WIDTH_IN_MM = page.WIDTH_IN_MM
 WIDTH = WIDTH_IN_MM * POS_SCALE
 HEIGHT = HEIGHT_IN_MM * POS_SCALE
 NODE_RADIUS = 40
 OFFSET_Y = 0
 OFFSET_X = (WIDTH - (2 * 400 * POS_SCALE)) / 2 + 20   # current circle radius = 400 * POS_SCALE --> (WIDTH - (2*400*POS_SCALE)) / 2
 ROOT_PATH_IMAGES = os.path.join('.', 'assets', 'images', 'persons', '')
+IMAGE_SIZE = 4 * NODE_RADIUS    # pixels of the embedded portraits: twice the rendered diameter
+IMAGE_WORKERS = os.cpu_count()  # size of the pool preparing the portraits
+IMAGE_PROCESSES = False         # whether the pool uses processes instead of threads
+SVG_CSS = os.path.join('assets', 'css', 'svg.css')
+FONT_CSS = os.path.join('assets', 'css', 'got-font.css')
+
+# the serialised definitions every drawing starts with and their elements, see add_static_defs
+_static_defs = dict()
+# path -> (modification time and size, content hash) of the assets, see asset_hash
+_asset_hashes = dict()
+
+
+def coordinate(value):
+    # a coordinate as it is written: rounded to PRECISION decimals if OPTIMIZE is set, 120.0 as 120
+    if not OPTIMIZE:
+        return value
+    value = round(value, PRECISION)
+    return int(value) if value == int(value) else value
+
+
+def point(x, y):
+    return (coordinate(x), coordinate(y))
+
+
+def bezier_path_data(start, control, end):
+    # the path data of a quadratic bezier, without the optional whitespace if OPTIMIZE is set
+    template = "M{} {}Q{} {} {} {}" if OPTIMIZE else "M {} {} Q {} {} {} {}"
+    return template.format(*(point(*start) + point(*control) + point(*end)))
 
 
 def draw_name(drawing, x, y, node):
     name = getattr(node, "name", None)
     if name is not None:
-        drawing.add(Text(name, insert=(x, y + NODE_RADIUS + SCALE), text_anchor="middle"))
+        drawing.add(Text(name, insert=point(x, y + NODE_RADIUS + SCALE), text_anchor="middle"))
 
         if EXPERIMENTAL:
             (start, end) = calc.calc_text_path(x, y)
@@ -58,14 +104,17 @@ def draw_name(drawing, x, y, node):
 def draw_house(drawing, x, y, node):
     house = getattr(node, "house-birth", None)
     if house is not None:
-        drawing.add(Text(house, insert=(x, y + NODE_RADIUS + 2 * SCALE), text_anchor="middle"))
+        drawing.add(Text(house, insert=point(x, y + NODE_RADIUS + 2 * SCALE), text_anchor="middle"))
 
 
 def draw_death(drawing, x, y, node, death_symbol):
     status = getattr(node, "status", None)
     if status is not None:
         if status == "Deceased":
-            u = drawing.use(death_symbol, insert=(x + NODE_RADIUS + 10, y - 20), size=(10, 20))
+            if OPTIMIZE:
+                u = drawing.use(death_symbol, insert=point(x + NODE_RADIUS + 10, y - 20))
+            else:
+                u = drawing.use(death_symbol, insert=(x + NODE_RADIUS + 10, y - 20), size=(10, 20))
             drawing.add(u)
 
 
@@ -82,27 +131,57 @@ def load_font_css(drawing, font_css_path):
         drawing.defs.add(drawing.style(css_string))
 
 
-def prepare_character_images(drawing):
-    # Load images base64 encoded to embed into svg file
-    character_images = dict()
+def image_path(id):
+    return ROOT_PATH_IMAGES + str(id) + ".jpeg"
+
 
-    for index in range(0, 84):
-        p = Pattern(x=0, y=0, width="100%", height="100%", viewBox="0 0 512 512")
-        image_path = ROOT_PATH_IMAGES + str(index) + ".jpeg"
+def id_sort_key(id):
+    # ints in numerical order before all other ids
+    return (not isinstance(id, int), str(id) if not isinstance(id, int) else id)
 
-        # Loading the image an convert it to base64 to integrate it directly
-        # into the graphic.
-        base64_prefix_href = "data:image/jpeg;base64,"
-        with open(image_path, 'rb') as image:
-            base64_encoded_string = base64.standard_b64encode(image.read())
-        href_base64_img = base64_prefix_href + base64_encoded_string.decode('utf-8')
 
+def start_character_images(graph, image_size=IMAGE_SIZE, workers=IMAGE_WORKERS,
+                           processes=IMAGE_PROCESSES):
+    # Starts loading the images of the nodes of the graph in a worker pool
+    # (see images.start_loading_images), they are scaled down to image_size pixels and cached.
+    # Returns the (still empty) patterns and the futures of their images, both ordered by node id.
+    ids = sorted([n.id for n in graph.nodes if os.path.exists(image_path(n.id))], key=id_sort_key)
+
+    futures = images.start_loading_images([image_path(id) for id in ids], image_size,
+                                          workers=workers, processes=processes)
+    return (ids, character_image_patterns(ids), futures)
+
+
+def character_image_patterns(ids):
+    # the (still empty) patterns of the images of the given node ids
+    return [Pattern(x=0, y=0, width="100%", height="100%", viewBox="0 0 512 512",
+                    id="image-%s" % id)
+            for id in ids]
+
+
+def load_character_images(graph, image_size=IMAGE_SIZE, workers=IMAGE_WORKERS,
+                          processes=IMAGE_PROCESSES):
+    # Loads the images of all nodes of the graph, node id -> base64 href.
+    # The result can be shared by several drawings (see draw_graph).
+    (ids, patterns, futures) = start_character_images(graph, image_size, workers, processes)
+    return dict((id, future.result()) for (id, future) in zip(ids, futures))
+
+
+def add_character_images(drawing, patterns, hrefs):
+    # Completes the patterns with their base64 encoded images and embeds them into the svg file.
+    # The patterns are added in the order given, whatever order the workers finish in.
+    # hrefs: the images of the patterns, in the same order
+    for (p, href_base64_img) in zip(patterns, hrefs):
         i = Image(href=href_base64_img, x="0%", y="0%", width=512, height=512)
         p.add(i)
         drawing.defs.add(p)
-        character_images[index] = p
 
-    return character_images
+
+def prepare_character_images(drawing, graph, image_size=IMAGE_SIZE):
+    # Load images base64 encoded to embed into svg file
+    (ids, patterns, futures) = start_character_images(graph, image_size)
+    add_character_images(drawing, patterns, (future.result() for future in futures))
+    return dict((id, p.get_paint_server()) for (id, p) in zip(ids, patterns))
 
 
 def create_arrow_marker(drawing):
@@ -110,7 +189,8 @@ def create_arrow_marker(drawing):
     # Creating a viewport for the marker.
     # Each viewport has a distance "SCALE" to the center of the node.
     arrow_marker = drawing.marker(
-        refX=50, refY=5, orient="auto", markerWidth=10 + NODE_RADIUS, markerHeight=10, markerUnits="userSpaceOnUse")
+        id="arrow", refX=50, refY=5, orient="auto", markerWidth=10 + NODE_RADIUS, markerHeight=10,
+        markerUnits="userSpaceOnUse")
     arrow_marker.add(drawing.path("M 0 0 L 10 5 L 0 10 z"))  # Draws an arrow as a marker
     # Adds the marker to the def section (invisible)
     drawing.defs.add(arrow_marker)
@@ -119,124 +199,275 @@ def create_arrow_marker(drawing):
 
 def load_death_symbol(drawing):
     # DEATH SYMBOL
-    death_symbol = Group()
+    death_symbol = Group(id="death-symbol")
     death_symbol.add(Path(id="death", d="M 10 0 L 10 40 M 0 12 L 20 12", stroke_width="5"))
     drawing.defs.add(death_symbol)
     return death_symbol
 
 
-def draw_background(drawing):
-
-    rad = RadialGradient(center=("50%","50%"), r="50%", focal=("50%", "50%"))
+def create_background_gradient(drawing):
+    rad = RadialGradient(center=("50%","50%"), r="50%", focal=("50%", "50%"), id="background")
     rad.add_stop_color(offset="0%", color="rgb(170,170,170)", opacity="1")
     rad.add_stop_color(offset="90%", color="rgb(0,0,0)", opacity="1")
     drawing.defs.add(rad)
+    return rad
+
+
+def asset_hash(path):
+    # the hash of the content of an asset, only read again when the file was modified
+    status = os.stat(path)
+    version = (status.st_mtime_ns, status.st_size)
+    cached = _asset_hashes.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with open(path, 'rb') as f:
+        content_hash = hashlib.sha1(f.read()).hexdigest()
+    _asset_hashes[path] = (version, content_hash)
+    return content_hash
+
+
+def add_static_defs(drawing, font=True):
+    # Adds the definitions that are the same in every drawing: the styling, the font
+    # (if font is set), the background gradient, the arrow marker and the death symbol.
+    # They are serialised once per content of the css files and then written as they are.
+    # Returns the elements (background_gradient, arrow_marker, death_symbol) to refer to.
+    key = (asset_hash(SVG_CSS), asset_hash(FONT_CSS) if font else None, NODE_RADIUS)
+    if key not in _static_defs:
+        recorder = FragmentRecorder(drawing)
+        load_styling(recorder, SVG_CSS)
+        if font:
+            load_font_css(recorder, FONT_CSS)
+        background_gradient = create_background_gradient(recorder)
+        arrow_marker = create_arrow_marker(recorder)
+        death_symbol = load_death_symbol(recorder)
+        _static_defs[key] = (recorder.getvalue(), (background_gradient, arrow_marker, death_symbol))
+        instrument.count("static_defs_compiled", 1)
+
+    (fragment, elements) = _static_defs[key]
+    drawing.add_def_fragment(fragment)
+    return elements
+
+
+def draw_background(drawing, background_gradient):
 
     size = max(WIDTH, HEIGHT) / 1.25
 
-    c = Circle(center=(WIDTH/2, HEIGHT/2), r=size, fill=rad.get_paint_server())
+    c = Circle(center=point(WIDTH/2, HEIGHT/2), r=coordinate(size),
+               fill=background_gradient.get_paint_server())
 
     drawing.add(c)
     # center = (WIDTH/2, HEIGHT/2)
     # gradient = RadialGradient(center, WIDTH/1.5)
 
 
-def draw_graph(graph):
-    # Draws the graph by creating a document, loading css & images, and inserting edges and nodes
-
-    # # Create a document
-
-    drawing = svgwrite.Drawing(filename="res.svg", size=('%dmm' %WIDTH_IN_MM, '%dmm' %HEIGHT_IN_MM))
+def draw_edge(drawing, e, arrow_marker, geometry, relevant):
+    # geometry: the row of the edge in the EdgeGeometry of the graph
+    # relevant: whether the edge is highlighted (see centrality.relevant_edges)
+    (visible, straight, start, end, (p1, p2)) = geometry
+    if not visible:
+        return
 
-    # Load styling
-    load_styling(drawing, "assets/css/svg.css")
-    load_font_css(drawing, "assets/css/got-font.css")
+    if straight:
+        line = Line(start=point(*start), end=point(*end))
 
-    draw_background(drawing)
-    drawing.add(Text("Game  of  Thrones", insert=(WIDTH/2 + 50, 300), class_="headline"))
+        relation = e.get("relation")
+        if relation is not None:
+            line["class"] = relation
 
-    # Load arrow marker for directed edges
-    arrow_marker = create_arrow_marker(drawing)
+        if e.directed:
+            line["marker-end"] = arrow_marker.get_funciri()
 
-    # Load cross for dead characters
-    death_symbol = load_death_symbol(drawing)
+        drawing.add(line)
+    else:
+        # use a bezier
+        path = Path(d=bezier_path_data(start, (p1, p2), end))
+        relation = e.get("relation")
+        if relation is not None:
+            path["class"] = relation
 
-    # load background images for nodes
-    character_images = prepare_character_images(drawing)
+        if relevant:
+            path["class"] = path["class"] + " HiRel"
 
-    # draw edges
-    for e in graph.edges:
-        start = (OFFSET_X + e.sourceNode.x, OFFSET_Y + e.sourceNode.y)
-        end = (OFFSET_X + e.targetNode.x, OFFSET_Y + e.targetNode.y)
+        if e.directed:
+            path["marker-end"] = arrow_marker.get_funciri()
 
-        single_edge_nodes = graph.get_single_edge_nodes()
+        drawing.add(path)
 
-        if e.sourceNode in single_edge_nodes or e.targetNode in single_edge_nodes:
-            line = Line(start=start, end=end)
 
-            hasattr(e, "relation")
-            relation = e.get("relation")
-            if relation is not None:
-                line["class"] = relation
+def edge_fragment_key(graph, e, relevant):
+    # everything draw_edge depends on
+    straight = graph.is_single_edge_node(e.sourceNode) or graph.is_single_edge_node(e.targetNode)
+    return (e.sourceNode.x, e.sourceNode.y, e.targetNode.x, e.targetNode.y, e.get("relation"),
+            e.directed, straight, relevant, NO_PARENTS, NO_SIBLINGS, OPTIMIZE, PRECISION)
 
-            if e.directed:
-                line["marker-end"] = arrow_marker.get_funciri()
 
-            drawing.add(line)
-        else:
-            # use a bezier
-            center_x =  WIDTH / 2
-            center_y = HEIGHT / 2
+def draw_label(drawing, node, position):
+    # the name and house of the node at the position found by the LabelPlacer
+    for (i, line) in enumerate(label_lines(node)):
+        text = Text(line, insert=point(position.x, position.y + i * SCALE),
+                    text_anchor=position.anchor)
+        if position.rotation:
+            text["transform"] = "rotate({} {} {})".format(round(position.rotation, 2),
+                                                          *point(position.x, position.y))
+        drawing.add(text)
 
-            # calculates the avg position of the center of the graph, start and end point
-            avg_x = int((center_x + start[0] + end[0]) / 3)
-            avg_y = int((center_y + start[1] + end[1]) / 3)
 
-            p1 = avg_x
-            p2 = avg_y
+def draw_node(drawing, n, character_images, death_symbol, labels=True, label_position=None):
+    # labels: whether the name and house are written
+    # label_position: where they are written (see draw_label), below the node if None
+    x = OFFSET_X + n.x  # * POS_SCALE
+    y = OFFSET_Y + n.y  # * POS_SCALE
+    f = character_images.get(n.id)
+    if f is not None:
+        c = Circle(center=point(x, y), r=NODE_RADIUS, fill=f)
+    else:
+        c = Circle(center=point(x, y), r=NODE_RADIUS, fill="green")  # , fill_opacity="0.4")
 
-            if e.get("relation") == "father" or e.get("relation") == "mother":
-                if NO_PARENTS:
-                    continue
-
-            # trying to get sibling relations edges to the outer of the circle...
-            if e.get("relation") == "sibling" or e.get("relation") == "father" or e.get("relation") == "mother":
-                if NO_SIBLINGS:
-                    continue
-
-                node_distance = calc.real_distance(start, end)
-                if node_distance < (500 * POS_SCALE):  # this is a distance threshold
-                    (p1, p2) = calc.calc_outer_bezier_focus((center_x, center_y), (start[0], start[1]), (end[0], end[1]))
-
-            path_string = "M {} {} Q {} {} {} {}".format(start[0], start[1], p1, p2, end[0], end[1])
-            path = Path(d=path_string)
-            relation = e.get("relation")
-            if relation is not None:
-                path["class"] = relation
+    drawing.add(c)
 
-            if e.score_relevance(graph.max_edge_count, graph.median_edge_count) > 0:
-                path["class"] = path["class"] + " HiRel"
+    draw_death(drawing, x, y, n, death_symbol)
+    if labels and label_position is not None:
+        draw_label(drawing, n, label_position)
+    elif labels:
+        draw_name(drawing, x, y, n)
+        draw_house(drawing, x, y, n)
 
-            if e.directed:
-                path["marker-end"] = arrow_marker.get_funciri()
 
-            drawing.add(path)
+def node_fragment_key(n, character_images, labels=True, label_position=None):
+    # everything draw_node depends on
+    return (n.x, n.y, character_images.get(n.id), n.get("name"), n.get("house-birth"),
+            n.get("status"), EXPERIMENTAL, labels, label_position, OPTIMIZE, PRECISION)
+
+
+class FragmentCache(object):
+
+    def __init__(self):
+        """Keeps the serialised svg of every node and edge between renders.
+
+        A fragment is reused as long as the key of its element is unchanged, the key
+        holds everything the drawing of the element depends on (positions, properties,
+        relation class, ...). So after a graph has been changed, only the changed
+        elements are drawn again. Fragments of elements that were not part of the last
+        render are dropped.
+
+        Pass the same cache to every draw_graph call for a graph:
+        >>> cache = FragmentCache()
+        >>> cache.hits, cache.misses
+        (0, 0)
+        """
+        self.entries = dict()
+        self.hits = 0
+        self.misses = 0
+        self._next_entries = None
+
+    def begin(self):
+        self._next_entries = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def end(self):
+        # everything that has not been rendered this time is stale
+        self.entries = self._next_entries
+        self._next_entries = None
+
+    def get(self, element, key):
+        entry = self.entries.get(element)
+        if entry is not None and entry[0] == key:
+            self.hits = self.hits + 1
+            self._next_entries[element] = entry
+            return entry[1]
+        return None
+
+    def put(self, element, key, fragment):
+        self.misses = self.misses + 1
+        self._next_entries[element] = (key, fragment)
+
+
+def render_fragment(cache, drawing, element, key, draw_function, *args):
+    # Returns the svg of an element drawn by draw_function(drawing, *args),
+    # from the cache if possible
+    if cache is not None:
+        fragment = cache.get(element, key)
+        if fragment is not None:
+            return fragment
+
+    recorder = FragmentRecorder(drawing)
+    draw_function(recorder, *args)
+    fragment = recorder.getvalue()
+
+    if cache is not None:
+        cache.put(element, key, fragment)
+    return fragment
+
+
+def draw_graph(graph, output="res.svg", cache=None, image_hrefs=None):
+    # Draws the graph by creating a document, loading css & images, and inserting edges and nodes.
+    # Every element is written to the output as soon as it is created (see StreamingDrawing).
+    # The images are prepared by a worker pool while the edges and nodes are drawn,
+    # their patterns are written to a second <defs> block at the end of the document.
+    # cache: a FragmentCache to reuse the svg of unchanged nodes and edges from the previous render
+    # image_hrefs: the images loaded before (see load_character_images), instead of loading them
 
-    # draw nodes
+    # # Create a document
+    # output: a file name or a writable text stream
+
+    drawing = StreamingDrawing(output, size=('%dmm' %WIDTH_IN_MM, '%dmm' %HEIGHT_IN_MM))
+    if cache is not None:
+        cache.begin()
+
+    # start loading the background images for nodes
+    if image_hrefs is None:
+        (image_ids, image_patterns, image_futures) = start_character_images(
+            graph, IMAGE_SIZE, IMAGE_WORKERS, IMAGE_PROCESSES)
+        hrefs = (future.result() for future in image_futures)
+    else:
+        image_ids = sorted([n.id for n in graph.nodes if n.id in image_hrefs], key=id_sort_key)
+        image_patterns = character_image_patterns(image_ids)
+        hrefs = (image_hrefs[id] for id in image_ids)
+    character_images = dict((id, p.get_paint_server())
+                            for (id, p) in zip(image_ids, image_patterns))
+
+    # Load styling, the background gradient, the arrow marker for directed edges
+    # and the cross for dead characters
+    (background_gradient, arrow_marker, death_symbol) = add_static_defs(drawing)
+
+    draw_background(drawing, background_gradient)
+    drawing.add(Text("Game  of  Thrones", insert=point(WIDTH/2 + 50, 300), class_="headline"))
+
+    # draw edges, their geometry is computed for all edges at once
+    geometry = EdgeGeometry(graph, OFFSET_X, OFFSET_Y, WIDTH, HEIGHT, NO_PARENTS, NO_SIBLINGS)
+    relevant_edges = centrality.relevant_edges(graph, HIGHLIGHT)
+    for (e, edge_geometry, relevant) in zip(graph.edges, geometry.rows(), relevant_edges):
+        drawing.add_fragment(render_fragment(cache, drawing, e,
+                                             edge_fragment_key(graph, e, relevant),
+                                             draw_edge, e, arrow_marker, edge_geometry, relevant))
+
+    # draw nodes, with their labels moved out of each other's way if asked to
+    label_positions = None
+    if LABEL_PLACEMENT:
+        label_positions = LabelPlacer(NODE_RADIUS, SCALE).place(graph, OFFSET_X, OFFSET_Y,
+                                                                (WIDTH / 2, HEIGHT / 2))
     for n in graph.nodes:
-        x = OFFSET_X + n.x  # * POS_SCALE
-        y = OFFSET_Y + n.y  # * POS_SCALE
-        f = character_images.get(n.id)
-        if f is not None:
-            c = Circle(center=(x, y), r=NODE_RADIUS, fill=f.get_paint_server())
-        else:
-            c = Circle(center=(x, y), r=NODE_RADIUS, fill="green")  # , fill_opacity="0.4")
-
-        drawing.add(c)
-
-        draw_death(drawing, x, y, n, death_symbol)
-        draw_name(drawing, x, y, n)
-        draw_house(drawing, x, y, n)
-
-    # save the svg file
-    drawing.save()
+        (labels, label_position) = (True, None)
+        if label_positions is not None:
+            label_position = label_positions.get(n.id)
+            labels = label_position is not None
+        key = node_fragment_key(n, character_images, labels, label_position)
+        drawing.add_fragment(render_fragment(cache, drawing, n, key, draw_node, n, character_images,
+                                             death_symbol, labels, label_position))
+
+    # embed the background images for nodes
+    add_character_images(drawing, image_patterns, hrefs)
+
+    # finish the svg file
+    drawing.close()
+    if cache is not None:
+        cache.end()
+
+    if instrument.is_enabled():
+        instrument.count("chars_written", drawing.chars_written)
+        if isinstance(output, str):
+            instrument.count("bytes_written", os.path.getsize(output))
+        if cache is not None:
+            instrument.count("fragment_cache_hits", cache.hits)
+            instrument.count("fragment_cache_misses", cache.misses)
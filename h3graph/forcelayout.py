@@ -0,0 +1,231 @@
+import math
+
+import numpy as np
+
+import h3graph.calc as calc
+import h3graph.page as page
+from h3graph.layout import OUTER_CIRCLE_RADIUS
+
+MAX_DEPTH = 16          # levels of the quadtree, cells at the last level are not split further
+MIN_DISTANCE = 1e-3     # distances are clamped to this to keep forces finite
+
+
+def morton_codes(cells):
+    """Interleaves the bits of the integer x and y cell coordinates (< 2**16).
+
+    >>> morton_codes(np.array([[0, 0], [1, 0], [0, 1], [3, 3]])).tolist()
+    [0, 1, 2, 15]
+    """
+    def spread_bits(v):
+        v = (v | (v << 8)) & 0x00FF00FF
+        v = (v | (v << 4)) & 0x0F0F0F0F
+        v = (v | (v << 2)) & 0x33333333
+        v = (v | (v << 1)) & 0x55555555
+        return v
+
+    cells = cells.astype(np.int64)
+    return spread_bits(cells[:, 0]) | (spread_bits(cells[:, 1]) << 1)
+
+
+class QuadTree(object):
+
+    def __init__(self, positions, max_depth=MAX_DEPTH):
+        """A Barnes-Hut quadtree over unit mass points, stored level by level in arrays.
+
+        Level l holds the occupied cells of size size / 2**l, identified by the prefixes
+        of the morton codes of the points, with their point count and centre of mass.
+        The children of a cell are a contiguous range of the next level.
+
+        :param positions: An (n, 2) array of coordinates.
+        """
+        self.max_depth = max_depth
+        lower = positions.min(axis=0)
+        self.size = max(float((positions.max(axis=0) - lower).max()), MIN_DISTANCE) * (1 + 1e-9)
+
+        side = 1 << max_depth
+        cells = np.clip(((positions - lower) / self.size * side).astype(np.int64), 0, side - 1)
+        codes = morton_codes(cells)
+
+        self.node_cells = []
+        self.counts = []
+        self.centres = []
+        self.child_start = []
+        self.child_end = []
+
+        keys_per_level = []
+        for level in range(0, max_depth + 1):
+            (keys, inverse) = np.unique(codes >> (2 * (max_depth - level)), return_inverse=True)
+            counts = np.bincount(inverse)
+            centres = np.empty((len(keys), 2))
+            centres[:, 0] = np.bincount(inverse, weights=positions[:, 0]) / counts
+            centres[:, 1] = np.bincount(inverse, weights=positions[:, 1]) / counts
+
+            keys_per_level.append(keys)
+            self.node_cells.append(inverse.reshape(-1))
+            self.counts.append(counts)
+            self.centres.append(centres)
+
+        for level in range(0, max_depth):
+            keys = keys_per_level[level]
+            child_keys = keys_per_level[level + 1]
+            self.child_start.append(np.searchsorted(child_keys, keys << 2))
+            self.child_end.append(np.searchsorted(child_keys, (keys << 2) + 4))
+
+    def repulsion(self, positions, theta=0.5):
+        """Sums delta / distance**2 over all other points for every point,
+        approximated with the tree.
+
+        A cell is used as a whole when size / distance < theta; it is opened otherwise.
+        All (point, cell) pairs of a level are handled in one vectorised step.
+
+        >>> points = np.array([[0.0, 0.0], [1.0, 0.0], [10.0, 0.0]])
+        >>> np.round(QuadTree(points).repulsion(points, theta=0.0), 3).tolist()
+        [[-1.1, 0.0], [0.889, 0.0], [0.211, 0.0]]
+        """
+        n = len(positions)
+        force = np.zeros((n, 2))
+        nodes = np.arange(n)
+        cells = np.zeros(n, dtype=np.int64)
+
+        for level in range(0, self.max_depth + 1):
+            if len(nodes) == 0:
+                break
+
+            counts = self.counts[level][cells]
+            centres = self.centres[level][cells]
+            own = self.node_cells[level][nodes] == cells
+            last_level = level == self.max_depth
+
+            cell_size = self.size / (1 << level)
+            delta = positions[nodes] - centres
+            distance2 = (delta * delta).sum(axis=1)
+
+            # far cells and single points are exact enough, the last level is not split further
+            far = (cell_size * cell_size < theta * theta * distance2) & ~own
+            accept = far | (counts == 1) | last_level
+
+            mass = counts.astype(float)
+            if last_level:
+                # remove the point itself from its own cell
+                mass = mass - own
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    own_centres = (centres * counts[:, None] - positions[nodes]) / mass[:, None]
+                centres = np.where(own[:, None], own_centres, centres)
+                delta = positions[nodes] - centres
+                distance2 = (delta * delta).sum(axis=1)
+            else:
+                # a single point cell containing the point itself exerts no force
+                mass = np.where(own & (counts == 1), 0.0, mass)
+
+            contributing = accept & (mass > 0)
+            weight = mass[contributing] / np.maximum(distance2[contributing],
+                                                     MIN_DISTANCE * MIN_DISTANCE)
+            target = nodes[contributing]
+            force[:, 0] += np.bincount(target, weights=delta[contributing, 0] * weight, minlength=n)
+            force[:, 1] += np.bincount(target, weights=delta[contributing, 1] * weight, minlength=n)
+
+            if last_level:
+                break
+
+            # open the remaining cells: pair the point with every child of the cell
+            opened = ~accept
+            opened_nodes = nodes[opened]
+            opened_cells = cells[opened]
+            start = self.child_start[level][opened_cells]
+            child_counts = self.child_end[level][opened_cells] - start
+            total = int(child_counts.sum())
+            first_child = np.cumsum(child_counts) - child_counts
+            offsets = np.arange(total) - np.repeat(first_child, child_counts)
+            nodes = np.repeat(opened_nodes, child_counts)
+            cells = np.repeat(start, child_counts) + offsets
+
+        return force
+
+
+class ForceDirectedLayout(object):
+
+    def __init__(self, iterations=300, tolerance=0.01, theta=0.5, gravity=0.05, cooling=0.97):
+        """Fruchterman-Reingold style force-directed layout with Barnes-Hut repulsion.
+
+        Nodes repel each other (k**2 / distance, approximated with a QuadTree in O(n log n)),
+        edges pull their nodes together (distance**2 / k) and a weak gravity keeps
+        disconnected parts together, with the ideal edge length k = 1. Every step moves a
+        node at most by the current temperature, which cools down geometrically.
+        The nodes start on a circle sorted by house-birth, so houses stay close together.
+        The result is scaled into the area of the circular layout.
+
+        :param iterations: The maximal number of steps.
+        :param tolerance: Stop early once no node moves further than tolerance * k.
+        :param theta: Barnes-Hut opening criterion, 0 computes all pairs exactly.
+        :param gravity: Strength of the pull towards the centre.
+        :param cooling: Factor the temperature is multiplied with after each step.
+        """
+        self.iterations = iterations
+        self.tolerance = tolerance
+        self.theta = theta
+        self.gravity = gravity
+        self.cooling = cooling
+        self.iterations_done = 0
+
+    def initial_positions(self, graph):
+        # Make house-birth characters neighbours
+        graph.sort_nodes_by_property("house-birth")
+        n = len(graph.nodes)
+        angles = np.arange(n) * (2.0 * math.pi / n)
+        radius = math.sqrt(n)
+        return np.column_stack((radius * np.cos(angles), radius * np.sin(angles)))
+
+    def step(self, positions, sources, targets, temperature):
+        """Moves the nodes once, returns the new positions and the largest move."""
+        n = len(positions)
+
+        displacement = QuadTree(positions).repulsion(positions, self.theta)
+
+        delta = positions[sources] - positions[targets]
+        distance = np.sqrt((delta * delta).sum(axis=1))
+        pull = delta * distance[:, None]
+        for axis in (0, 1):
+            displacement[:, axis] -= np.bincount(sources, weights=pull[:, axis], minlength=n)
+            displacement[:, axis] += np.bincount(targets, weights=pull[:, axis], minlength=n)
+
+        displacement -= self.gravity * (positions - positions.mean(axis=0))
+
+        length = np.sqrt((displacement * displacement).sum(axis=1))
+        limited = np.minimum(length, temperature)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            move = np.where(length[:, None] > 0, displacement * (limited / length)[:, None], 0.0)
+        return (positions + move, float(limited.max()))
+
+    def apply(self, graph):
+        n = len(graph.nodes)
+        if n == 0:
+            return
+
+        positions = self.initial_positions(graph)
+        index = dict((node.id, i) for (i, node) in enumerate(graph.nodes))
+        sources = np.array([index[e.sourceNode.id] for e in graph.edges], dtype=np.int64)
+        targets = np.array([index[e.targetNode.id] for e in graph.edges], dtype=np.int64)
+
+        temperature = math.sqrt(n) / 10 + 1
+        self.iterations_done = 0
+        for i in range(0, self.iterations if n > 1 else 0):
+            (positions, largest_move) = self.step(positions, sources, targets, temperature)
+            self.iterations_done = i + 1
+            if largest_move < self.tolerance:
+                break
+            temperature = temperature * self.cooling
+
+        self.fit(graph, positions)
+
+    @staticmethod
+    def fit(graph, positions):
+        # centre the positions like the circles of the circular layout, within the outer circle
+        centre = positions.mean(axis=0)
+        extent = np.sqrt(((positions - centre) ** 2).sum(axis=1)).max()
+        scale = OUTER_CIRCLE_RADIUS / extent if extent > 0 else 0.0
+        centre_x = page.WIDTH_IN_MM / 2 * calc.POS_SCALE
+        centre_y = page.HEIGHT_IN_MM / 2 * calc.POS_SCALE
+
+        for (node, (x, y)) in zip(graph.nodes, (positions - centre) * scale):
+            node.x = centre_x + float(x)
+            node.y = centre_y + float(y)
@@ -0,0 +1,108 @@
+import numpy as np
+
+import h3graph.calc as calc
+
+PARENT_RELATIONS = ("father", "mother")
+OUTER_BEZIER_RELATIONS = ("sibling", "father", "mother")
+OUTER_BEZIER_DISTANCE = 500 * calc.POS_SCALE   # closer sibling/parent edges bend outwards
+
+
+def outer_bezier_focus(center, n1, n2, width, height):
+    """calc.calc_outer_bezier_focus for arrays of points n1, n2 (shape (k, 2)).
+
+    The operations are done in the same order, so the results are identical.
+    Returns the focus points and which of them have been moved to the top (y = -200).
+
+    >>> import h3graph.draw as draw
+    >>> n1, n2 = np.array([[100.0, 200.0]]), np.array([[300.0, 250.0]])
+    >>> (focus, top) = outer_bezier_focus((500.0, 500.0), n1, n2, draw.WIDTH, draw.HEIGHT)
+    >>> expected = calc.calc_outer_bezier_focus((500.0, 500.0), (100.0, 200.0), (300.0, 250.0))
+    >>> tuple(focus[0]) == expected
+    True
+    """
+    # vector between n1 and n2, its middle and the vector from the center to the middle
+    v = n1 - n2
+    middle = n2 + v / 2
+    d = middle - center
+
+    dist = (v[:, 0] * v[:, 0]) + (v[:, 1] * v[:, 1])
+
+    b = dist / calc.radius
+    fancy_var = b + calc.radius
+    to_middle = center - middle
+    vector_length = np.sqrt((to_middle * to_middle).sum(axis=1))
+    strength = fancy_var / vector_length
+
+    focus = center + strength[:, None] * d
+
+    # keep the focus on the canvas
+    top = focus[:, 1] < 0
+    focus[:, 0] = np.where(focus[:, 0] > width, width, focus[:, 0])
+    focus[:, 1] = np.where(top, -200, np.where(focus[:, 1] > height, height + 300, focus[:, 1]))
+    return (focus, top)
+
+
+class EdgeGeometry(object):
+
+    def __init__(self, graph, offset_x, offset_y, width, height,
+                 no_parents=False, no_siblings=False):
+        """Start, end and control points of all edges of a graph, computed in one pass.
+
+        Edges touching a single edge node are straight lines. All others are quadratic
+        beziers whose control point is the average of the canvas center, start and end;
+        sibling and parent edges of close nodes bend outwards (see outer_bezier_focus)
+        and are hidden with no_siblings, parent edges also with no_parents.
+
+        :param graph: The graph, its nodes need positions.
+        :param offset_x: Added to all x coordinates.
+        :param offset_y: Added to all y coordinates.
+        :param width: The width of the canvas.
+        :param height: The height of the canvas.
+        """
+        edges = graph.edges
+        count = len(edges)
+        center = np.array([width / 2, height / 2])
+
+        positions = np.array([(e.sourceNode.x, e.sourceNode.y, e.targetNode.x, e.targetNode.y)
+                              for e in edges], dtype=float).reshape(count, 4)
+        self.start = positions[:, 0:2] + (offset_x, offset_y)
+        self.end = positions[:, 2:4] + (offset_x, offset_y)
+
+        single = graph.is_single_edge_node
+        self.straight = np.array([single(e.sourceNode) or single(e.targetNode) for e in edges],
+                                 dtype=bool)
+        relations = [e.get("relation") for e in edges]
+        parent = np.array([r in PARENT_RELATIONS for r in relations], dtype=bool)
+        bends = np.array([r in OUTER_BEZIER_RELATIONS for r in relations], dtype=bool)
+
+        self.visible = np.ones(count, dtype=bool)
+        if no_parents:
+            self.visible &= ~(parent & ~self.straight)
+        if no_siblings:
+            self.visible &= ~(bends & ~self.straight)
+
+        # the average of the center of the graph, start and end point (truncated)
+        self.control = np.trunc((center + self.start + self.end) / 3)
+
+        delta = self.start - self.end
+        distance = np.sqrt((delta[:, 0] * delta[:, 0]) + (delta[:, 1] * delta[:, 1]))
+        self.outer = bends & ~self.straight & (distance < OUTER_BEZIER_DISTANCE)
+        self.top = np.zeros(count, dtype=bool)
+        if self.outer.any():
+            (self.control[self.outer], self.top[self.outer]) = outer_bezier_focus(
+                center, self.start[self.outer], self.end[self.outer], width, height)
+
+    def rows(self):
+        """Yields (visible, straight, start, end, control) for each edge as python numbers.
+
+        The truncated average control points and the top clamped y are ints, so they
+        are formatted like ints.
+        """
+        for (visible, straight, outer, top, start, end, control) in zip(
+                self.visible.tolist(), self.straight.tolist(), self.outer.tolist(),
+                self.top.tolist(), self.start.tolist(), self.end.tolist(), self.control.tolist()):
+            if not outer:
+                control = (int(control[0]), int(control[1]))
+            elif top:
+                control = (control[0], int(control[1]))
+            yield (visible, straight, tuple(start), tuple(end), tuple(control))
@@ -0,0 +1,172 @@
+import xml.etree.ElementTree
+
+
+def parse_boolean(text):
+    return text.strip().lower() in ("true", "1", "yes")
+
+
+# maps the attr.type of a <key> declaration to a function converting the text of <data>
+GRAPHML_TYPES = {
+    "boolean": parse_boolean,
+    "int": int,
+    "long": int,
+    "float": float,
+    "double": float,
+    "string": str,
+}
+
+
+def parse_id(text):
+    """Node ids are ints whenever possible (the images are named after them).
+
+    >>> parse_id("42")
+    42
+    >>> parse_id("n42")
+    'n42'
+    """
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def local_name(tag):
+    """Strips the namespace of a tag: {http://graphml.graphdrawing.org/xmlns}node -> node"""
+    return tag.rpartition("}")[2]
+
+
+class Key(object):
+
+    def __init__(self, id, name=None, domain="all", type="string", default=None):
+        """Declaration of a GraphML attribute (<key> element).
+
+        :param id: The id the <data> elements refer to.
+        :param name: The property name (attr.name), defaults to the id.
+        :param domain: The element kind the key is declared for (node, edge, graph or all).
+        :param type: The declared attr.type.
+        :param default: The text of the <default> element, if any.
+
+        >>> key = Key("d0", "weight", "edge", "double", "1.5")
+        >>> key.convert("2")
+        2.0
+        >>> key.applies_to("edge"), key.applies_to("node")
+        (True, False)
+        >>> key.default_value()
+        1.5
+        """
+        self.id = id
+        self.name = name if name is not None else id
+        self.domain = domain
+        self.type = type
+        self.default = default
+
+    @staticmethod
+    def from_element(element):
+        """The declaration of a parsed <key> element."""
+        default = None
+        for child in element:
+            if local_name(child.tag) == "default":
+                default = child.text
+        return Key(element.get("id"), element.get("attr.name"), element.get("for", "all"),
+                   element.get("attr.type", "string"), default)
+
+    def applies_to(self, kind):
+        return self.domain in ("all", kind)
+
+    def convert(self, text):
+        if text is None:
+            return None
+        return GRAPHML_TYPES.get(self.type, str)(text)
+
+    def default_value(self):
+        return self.convert(self.default)
+
+
+def read_properties(element, keys, kind):
+    """Collects the <data> children of a node or edge, converted by their declared type."""
+    properties = dict()
+    for data in element:
+        if local_name(data.tag) != "data":
+            continue
+        key_id = data.get("key")
+        key = keys.get(key_id)
+        if key is None:
+            # undeclared keys are kept as raw strings
+            properties[key_id] = data.text
+        else:
+            properties[key.name] = key.convert(data.text)
+
+    # fill in the declared defaults
+    for key in keys.values():
+        if key.default is not None and key.applies_to(kind) and key.name not in properties:
+            properties[key.name] = key.default_value()
+
+    return properties
+
+
+def is_directed(edge, default):
+    """Whether an <edge> is directed: its directed attribute, the edgedefault of the graph
+    if it has none."""
+    directed = edge.get("directed")
+    if directed is None:
+        return default
+    return parse_boolean(directed)
+
+
+def iter_graphml(source):
+    """Streams the nodes and edges of a GraphML file.
+
+    The file is read with iterparse and every element is dropped from the tree
+    once it has been consumed, so memory does not grow with the file size.
+
+    :param source: A file name or a binary file object.
+    :return: A generator of ("node", id, properties) and
+             ("edge", source_id, target_id, directed, properties) tuples.
+
+    >>> import io
+    >>> doc = io.BytesIO(b'''<graphml>
+    ...   <key id="age" for="node" attr.name="age" attr.type="int"/>
+    ...   <key id="relation" attr.name="relation" attr.type="string"/>
+    ...   <graph edgedefault="directed">
+    ...     <node id="0"><data key="age">17</data></node>
+    ...     <node id="1"/>
+    ...     <edge source="0" target="1" directed="false"><data key="relation">sibling</data></edge>
+    ...   </graph>
+    ... </graphml>''')
+    >>> for element in iter_graphml(doc):
+    ...     print(element)
+    ('node', 0, {'age': 17})
+    ('node', 1, {})
+    ('edge', 0, 1, False, {'relation': 'sibling'})
+    """
+    keys = dict()
+    edge_default_directed = True
+    parents = []
+
+    for event, element in xml.etree.ElementTree.iterparse(source, events=("start", "end")):
+        tag = local_name(element.tag)
+
+        if event == "start":
+            if tag == "graph":
+                edge_default_directed = element.get("edgedefault", "directed") != "undirected"
+            parents.append(element)
+            continue
+
+        parents.pop()
+
+        if tag == "key":
+            key = Key.from_element(element)
+            keys[key.id] = key
+        elif tag == "node":
+            yield ("node", parse_id(element.get("id")), read_properties(element, keys, "node"))
+        elif tag == "edge":
+            yield ("edge", parse_id(element.get("source")), parse_id(element.get("target")),
+                   is_directed(element, edge_default_directed),
+                   read_properties(element, keys, "edge"))
+        else:
+            continue
+
+        # the element has been consumed, release it (and its <data> children)
+        element.clear()
+        if parents:
+            parents[-1].remove(element)
@@ -0,0 +1,100 @@
+import base64
+import concurrent.futures
+import hashlib
+import io
+import os
+import threading
+
+try:
+    from PIL import Image
+except ImportError:  # without Pillow the images are embedded at their original size
+    Image = None
+
+IMAGE_CACHE_DIR = os.path.join('.', '.cache', 'h3graph', 'images')
+JPEG_QUALITY = 85
+BASE64_PREFIX_HREF = "data:image/jpeg;base64,"
+
+
+def cache_key(content, size):
+    """The cache entry of an image depends on its content and the size it is scaled to.
+
+    >>> cache_key(b'image', 160) == cache_key(b'image', 160)
+    True
+    >>> cache_key(b'image', 160) == cache_key(b'image', 80)
+    False
+    """
+    digest = hashlib.sha256(content)
+    digest.update(('|%s|%s' % (size, JPEG_QUALITY if Image is not None else None)).encode('ascii'))
+    return digest.hexdigest()
+
+
+def downscale(content, size):
+    """Scales a jpeg down so that it fits into size x size pixels (images are never enlarged)."""
+    if Image is None or size is None:
+        return content
+
+    image = Image.open(io.BytesIO(content))
+    if image.width <= size and image.height <= size:
+        return content
+
+    image = image.convert('RGB')
+    image.thumbnail((size, size), Image.LANCZOS)
+    result = io.BytesIO()
+    image.save(result, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    return result.getvalue()
+
+
+def load_image_href(path, size=None, cache_dir=IMAGE_CACHE_DIR):
+    """Returns the image as base64 data href, scaled down to size pixels.
+
+    The encoded result is cached in cache_dir, keyed by the hash of the file content and the
+    size, so an image is only decoded and scaled again after it has been changed.
+
+    :param path: The path of the jpeg file.
+    :param size: The maximal width and height in pixels, None keeps the original size.
+    :param cache_dir: The cache directory, None disables the cache.
+    :return: The data href to embed into the svg.
+    """
+    with open(path, 'rb') as image:
+        content = image.read()
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, cache_key(content, size) + '.b64')
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                return f.read()
+
+    href = BASE64_PREFIX_HREF + base64.standard_b64encode(downscale(content, size)).decode('utf-8')
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temporary file first, concurrent renders must never read half an entry
+        tmp_path = '%s.%d.%d.tmp' % (cache_path, os.getpid(), threading.get_ident())
+        with open(tmp_path, 'w') as f:
+            f.write(href)
+        os.replace(tmp_path, cache_path)
+
+    return href
+
+
+def start_loading_images(paths, size=None, cache_dir=IMAGE_CACHE_DIR, workers=None,
+                         processes=False):
+    """Loads the images (see load_image_href) in a pool of worker threads or processes.
+
+    The work is started right away, the caller continues while the images are decoded,
+    scaled and encoded.
+
+    :param paths: The paths of the jpeg files.
+    :param workers: The number of workers, None for the default of concurrent.futures.
+    :param processes: Whether to use worker processes instead of threads.
+    :return: The futures of the hrefs, in the order of paths.
+    """
+    if processes:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    futures = [executor.submit(load_image_href, path, size, cache_dir) for path in paths]
+    # the submitted work still runs, the workers terminate once it is done
+    executor.shutdown(wait=False)
+    return futures
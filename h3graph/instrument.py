@@ -0,0 +1,142 @@
+import contextlib
+import logging
+import time
+
+logger = logging.getLogger("h3graph")
+
+# the instrumentation the pipeline reports to, None while it is disabled
+_active = None
+
+# returned by stage() while disabled, entering and leaving it does nothing
+_NO_STAGE = contextlib.nullcontext()
+
+
+class Instrumentation(object):
+
+    def __init__(self, callback=None, log_level=logging.INFO, profile=False, trace_memory=False):
+        """Collects the timings and counters of the pipeline stages (load, update_graph,
+        define_node_positions, draw) while it is enabled (see enable).
+
+        Every finished stage and every counter is logged to the "h3graph" logger and
+        passed to the callback.
+
+        >>> events = []
+        >>> def callback(kind, record):
+        ...     events.append((kind, record['name']))
+        >>> instrumentation = Instrumentation(callback=callback)
+        >>> with enabled(instrumentation):
+        ...     with stage('load'):
+        ...         count('nodes', 3)
+        >>> events
+        [('counter', 'nodes'), ('stage', 'load')]
+        >>> instrumentation.counters
+        {'nodes': 3}
+        >>> sorted(instrumentation.stages[0])
+        ['cpu', 'name', 'time']
+
+        :param callback: Called with ("stage", record) or ("counter", record) for every event.
+        :param log_level: The level the events are logged with.
+        :param profile: Whether to run every stage under cProfile,
+                        the profiles are kept in profiles.
+        :param trace_memory: Whether to measure the peak of the memory allocated in every stage
+                             with tracemalloc (this slows the stages down considerably).
+        """
+        self.callback = callback
+        self.log_level = log_level
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.counters = dict()
+        self.profiles = dict()
+        self._profiling = False
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # cProfile and tracemalloc are only imported when they are asked for
+        profiler = None
+        if self.profile and not self._profiling:
+            # cProfile can not be nested, inner stages are part of the profile of the outer one
+            import cProfile
+            profiler = cProfile.Profile()
+            self._profiling = True
+        started_tracing = False
+        if self.trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                self.profiles[name] = profiler
+            record = {"name": name, "time": time.perf_counter() - wall,
+                      "cpu": time.process_time() - cpu}
+            if self.trace_memory:
+                record["peak"] = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            self.stages.append(record)
+            self._emit("stage", record)
+
+    def count(self, name, value):
+        self.counters[name] = value
+        self._emit("counter", {"name": name, "value": value})
+
+    def _emit(self, kind, record):
+        if logger.isEnabledFor(self.log_level):
+            if kind == "stage":
+                message = "stage %(name)s: %(time).3fs wall, %(cpu).3fs cpu"
+                if "peak" in record:
+                    message = message + ", %(peak)d bytes peak"
+                logger.log(self.log_level, message, record)
+            else:
+                logger.log(self.log_level, "%(name)s: %(value)s", record)
+        if self.callback is not None:
+            self.callback(kind, record)
+
+
+def enable(instrumentation):
+    """Makes the pipeline report to the instrumentation, returns the one reported to before."""
+    global _active
+    previous = _active
+    _active = instrumentation
+    return previous
+
+
+def disable():
+    enable(None)
+
+
+@contextlib.contextmanager
+def enabled(instrumentation):
+    previous = enable(instrumentation)
+    try:
+        yield instrumentation
+    finally:
+        enable(previous)
+
+
+def is_enabled():
+    return _active is not None
+
+
+def stage(name):
+    """Times the stage, for use in a with statement; does nothing while disabled."""
+    if _active is None:
+        return _NO_STAGE
+    return _active.stage(name)
+
+
+def count(name, value):
+    """Reports a counter, like the number of nodes; does nothing while disabled."""
+    if _active is not None:
+        _active.count(name, value)
@@ -0,0 +1,186 @@
+import collections
+import math
+
+from h3graph.spatial import GridIndex, overlaps
+
+FONT_SIZE = 16      # the default font size, the labels are not styled otherwise
+CHAR_WIDTH = 9      # estimated average width of a character
+CELL_SIZE = 64      # cells of the spatial hash, about the height of a label
+MARGIN = 8          # between a node and its label
+
+# a placed label: the insert point of its first line, the text anchor and the rotation
+# (in degrees, around the insert point); further lines follow one line height below
+LabelPosition = collections.namedtuple("LabelPosition", ("x", "y", "anchor", "rotation"))
+
+
+def label_lines(node):
+    """The lines of the label of a node: its name and its house."""
+    return [str(value) for value in (node.get("name"), node.get("house-birth"))
+            if value is not None]
+
+
+def count_collisions(index, boxes, box, ignore=None, limit=None):
+    """The number of boxes in the index overlapping box, counted up to limit.
+
+    >>> index = GridIndex(10)
+    >>> boxes = [(0, 0, 5, 5), (2, 2, 8, 8), (20, 20, 25, 25)]
+    >>> for (i, b) in enumerate(boxes):
+    ...     index.insert(i, b)
+    >>> count_collisions(index, boxes, (1, 1, 6, 6))
+    2
+    >>> count_collisions(index, boxes, (1, 1, 6, 6), ignore=0)
+    1
+    >>> count_collisions(index, boxes, (1, 1, 6, 6), limit=1)
+    1
+
+    :param index: A GridIndex of the positions of boxes.
+    :param boxes: The boxes of the items of the index.
+    :param box: The box to check.
+    :param ignore: An item not to count, e.g. the node of a label.
+    :param limit: Stop counting there, None counts all.
+    """
+    # an item filed under several cells is checked once per cell, but only counted once
+    colliding = set()
+    for items in index.iter_cells(box):
+        for i in items:
+            if i != ignore and overlaps(boxes[i], box):
+                colliding.add(i)
+                if len(colliding) == limit:
+                    return limit
+    return len(colliding)
+
+
+class LabelPlacer(object):
+
+    def __init__(self, node_radius, line_height, hide_colliding=False, cell_size=CELL_SIZE):
+        """Places the labels of the nodes where they overlap neither other labels nor nodes.
+
+        Every label tries its candidate positions in turn: below the node (where labels
+        are drawn by default), above, right and left of it, and rotated along the line
+        from the centre through the node, outwards and inwards. It takes the first free
+        one. The boxes of the nodes and of the placed labels are kept in a uniform grid
+        (see spatial.GridIndex), so a candidate is only checked against the boxes near it
+        and placing n labels takes about linear time. Labels of nodes with more edges
+        are placed first.
+
+        >>> import h3graph
+        >>> graph = h3graph.Graph()
+        >>> a, b = graph.add_new_node(1, name='Arya'), graph.add_new_node(2, name='Sansa')
+        >>> a.x, a.y, b.x, b.y = 100, 100, 100, 190
+        >>> positions = LabelPlacer(40, 20).place(graph, 0, 0, (500, 500))
+
+        Below Arya there is Sansa, so Arya's label goes above:
+        >>> positions[1]
+        LabelPosition(x=100, y=52, anchor='middle', rotation=0)
+        >>> positions[2]
+        LabelPosition(x=100, y=250, anchor='middle', rotation=0)
+
+        :param node_radius: The radius of the nodes.
+        :param line_height: The distance between the lines of a label.
+        :param hide_colliding: Whether labels without a free position are left out;
+                               otherwise they take the candidate with the fewest collisions.
+        :param cell_size: The size of the cells of the spatial hash.
+        """
+        self.node_radius = node_radius
+        self.line_height = line_height
+        self.hide_colliding = hide_colliding
+        self.cell_size = cell_size
+
+    def candidates(self, x, y, center, line_count):
+        """The candidate positions of a label of a node at x,y, in order of preference."""
+        r = self.node_radius
+        h = self.line_height
+        block = h * (line_count - 1)
+        middle = y - block / 2 + FONT_SIZE / 3    # first baseline of a vertically centred label
+
+        yield LabelPosition(x, y + r + h, "middle", 0)
+        yield LabelPosition(x, y - r - MARGIN - block, "middle", 0)
+        yield LabelPosition(x + r + 3 * MARGIN, middle, "start", 0)    # behind the death symbol
+        yield LabelPosition(x - r - MARGIN, middle, "end", 0)
+
+        angle = math.atan2(y - center[1], x - center[0])
+        for direction in (1, -1):
+            (cos, sin) = (direction * math.cos(angle), direction * math.sin(angle))
+            # keep the text upright: on the left it is turned by 180 degrees and ends at the node
+            upright = cos >= 0
+            if upright:
+                rotation = math.degrees(math.atan2(sin, cos))
+            else:
+                rotation = math.degrees(math.atan2(-sin, -cos))
+            (px, py) = (x + (r + MARGIN) * cos, y + (r + MARGIN) * sin)
+            shift = FONT_SIZE / 3 - block / 2
+            theta = math.radians(rotation)
+            yield LabelPosition(px - shift * math.sin(theta), py + shift * math.cos(theta),
+                                "start" if upright else "end", rotation)
+
+    def box(self, position, lines):
+        """The bounding box of a label at the position."""
+        width = max(len(line) for line in lines) * CHAR_WIDTH
+        if position.anchor == "start":
+            (left, right) = (0, width)
+        elif position.anchor == "end":
+            (left, right) = (-width, 0)
+        else:
+            (left, right) = (-width / 2, width / 2)
+        (top, bottom) = (-FONT_SIZE, self.line_height * (len(lines) - 1) + FONT_SIZE / 4)
+
+        if not position.rotation:
+            return (position.x + left, position.y + top, position.x + right, position.y + bottom)
+
+        theta = math.radians(position.rotation)
+        (cos, sin) = (math.cos(theta), math.sin(theta))
+        xs = []
+        ys = []
+        for (cx, cy) in ((left, top), (right, top), (left, bottom), (right, bottom)):
+            xs.append(position.x + cx * cos - cy * sin)
+            ys.append(position.y + cx * sin + cy * cos)
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def place(self, graph, offset_x, offset_y, center):
+        """Returns the positions of the labels of all nodes with a label, node id -> LabelPosition.
+
+        Hidden labels (see hide_colliding) map to None.
+
+        :param graph: The graph (or GraphView), its nodes need positions.
+        :param offset_x: Added to the x coordinates of the nodes.
+        :param offset_y: Added to the y coordinates of the nodes.
+        :param center: The centre of the drawing, the rotated labels point away from it.
+        """
+        index = GridIndex(self.cell_size)
+        boxes = []
+        own_box = dict()
+        r = self.node_radius
+        for n in graph.nodes:
+            (x, y) = (offset_x + n.x, offset_y + n.y)
+            own_box[n.id] = len(boxes)
+            index.insert(len(boxes), (x - r, y - r, x + r, y + r))
+            boxes.append((x - r, y - r, x + r, y + r))
+
+        result = dict()
+        nodes = sorted(graph.nodes, key=lambda n: -graph.get_degree(n))
+        for n in nodes:
+            lines = label_lines(n)
+            if not lines:
+                continue
+
+            best = None
+            best_box = None
+            best_collisions = None
+            for position in self.candidates(offset_x + n.x, offset_y + n.y, center, len(lines)):
+                box = self.box(position, lines)
+                # a candidate only matters if it has fewer collisions than the best one so far,
+                # hidden labels only need to know whether there is any
+                limit = 1 if self.hide_colliding else best_collisions
+                collisions = count_collisions(index, boxes, box, own_box[n.id], limit)
+                if best_collisions is None or collisions < best_collisions:
+                    (best, best_box, best_collisions) = (position, box, collisions)
+                if collisions == 0:
+                    break
+
+            if best_collisions > 0 and self.hide_colliding:
+                result[n.id] = None
+                continue
+            index.insert(len(boxes), best_box)
+            boxes.append(best_box)
+            result[n.id] = best
+        return result
@@ -0,0 +1,92 @@
+import h3graph.calc as calc
+import h3graph.page as page
+
+# radii of the circles of the circular layout
+MAIN_CIRCLE_RADIUS = 400 * calc.POS_SCALE
+OUTER_CIRCLE_RADIUS = 450 * calc.POS_SCALE
+
+
+class CircularLayout(object):
+    """Places the nodes on a circle, sorted by house-birth,
+    and their single edge nodes on an outer circle."""
+
+    def apply(self, graph):
+        """Sets node.x and node.y of all nodes, the positions of an earlier layout are ignored.
+
+        >>> import h3graph
+        >>> graph = h3graph.Graph()
+        >>> nodes = [graph.add_new_node(i) for i in range(6)]
+        >>> for (a, b) in [(0, 1), (1, 2), (2, 0), (3, 0), (4, 5)]:
+        ...     edge = graph.add_new_edge(nodes[a], nodes[b])
+        >>> CircularLayout().apply(graph)
+        >>> first = [(n.x, n.y) for n in graph.nodes]
+        >>> (nodes[5].x, nodes[5].y) = (0, 0)
+        >>> CircularLayout().apply(graph)
+        >>> [(n.x, n.y) for n in graph.nodes] == first
+        True
+        """
+        # Make house-birth characters neighbours
+        graph.sort_nodes_by_property("house-birth")
+
+        # Find nodes that have a single edge only an reposition them:
+        single_edge_nodes = graph.get_single_edge_nodes()
+
+        # Calculate counts on each circle
+        total_node_count = len(graph.nodes)
+        main_circle_nodes = total_node_count - len(single_edge_nodes)
+
+        # calculate all possible circle positions
+        positions = calc.calc_positions(main_circle_nodes, page.WIDTH_IN_MM, page.HEIGHT_IN_MM,
+                                        MAIN_CIRCLE_RADIUS)
+        # the outer circle needs at least one slot per single edge node
+        outer_circle_slots = calc.CircleSlots(max(main_circle_nodes, len(single_edge_nodes)),
+                                              page.WIDTH_IN_MM, page.HEIGHT_IN_MM,
+                                              OUTER_CIRCLE_RADIUS)
+
+        # the nodes placed in this pass, positions of an earlier layout are stale
+        placed = set()
+
+        index = 0
+        for node in graph.nodes:
+            if graph.is_single_edge_node(node):
+                continue
+
+            node.x = positions[index][0]
+            node.y = positions[index][1]
+            placed.add(node.id)
+
+            index = index + 1
+
+        # positioning single edge nodes
+        for sen in single_edge_nodes:
+            neighbours = graph.get_neighbours_of(sen)
+            if (len(neighbours) > 0):
+                neighbour = neighbours[0]
+                if neighbour.id not in placed:
+                    # the neighbour is an unplaced single edge node itself: take any slot
+                    (x, y) = outer_circle_slots.take_nearest(outer_circle_slots.center_x + 1,
+                                                             outer_circle_slots.center_y)
+                else:
+                    (x, y) = outer_circle_slots.take_nearest(neighbour.x, neighbour.y)
+                sen.x = x
+                sen.y = y
+                placed.add(sen.id)
+
+
+def get_layout(layout):
+    """Returns the layout engine for a name, engine objects are returned as they are.
+
+    A layout engine is any object with an apply(graph) method setting node.x and node.y.
+
+    >>> get_layout("circular").__class__.__name__
+    'CircularLayout'
+    """
+    if not isinstance(layout, str):
+        return layout
+    if layout == "circular":
+        return CircularLayout()
+    if layout == "force":
+        # needs numpy, only imported when asked for
+        from h3graph.forcelayout import ForceDirectedLayout
+        return ForceDirectedLayout()
+    raise ValueError("Unknown layout: %s" % layout)
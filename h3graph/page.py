@@ -0,0 +1,4 @@
+# the size of the drawing, A0 portrait; kept apart from h3graph.draw so the layouts
+# can be used without svgwrite
+HEIGHT_IN_MM = 1189
+WIDTH_IN_MM = 841
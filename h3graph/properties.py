@@ -0,0 +1,260 @@
+import threading
+
+_MISSING = object()
+
+# the number of distinct values STRINGS interns per property, later unseen values of
+# that property are kept as plain strings (unique values like names would otherwise
+# grow it forever, while categorical values like houses stay shared)
+STRING_VALUES_PER_KEY = 1024
+
+
+class StringTable(object):
+
+    def __init__(self, values_per_key=STRING_VALUES_PER_KEY):
+        """Interns strings as integer codes.
+
+        Property names and string values (house names, relation types, ...) repeat
+        a lot across nodes and edges, so each distinct string is stored once and
+        the elements only keep its code.
+
+        >>> table = StringTable(values_per_key=2)
+        >>> table.code('House Stark'), table.code('House Lannister'), table.code('House Stark')
+        (0, 1, 0)
+        >>> table.string(1)
+        'House Lannister'
+        >>> [table.code(name, key='name') for name in ('Arya', 'Sansa', 'Bran', 'Arya')]
+        [2, 3, None, 2]
+        >>> table.code('House Tully', key='house'), table.code('Bran')
+        (4, 5)
+
+        :param values_per_key: The number of new strings code(string, key) interns for
+                               each key, None is returned for further unseen strings.
+        """
+        self.codes = dict()
+        self.strings = []
+        self.values_per_key = values_per_key
+        self._key_counts = dict()
+        self._lock = threading.Lock()
+
+    def code(self, string, key=None):
+        """Returns the code of a string, interning it if necessary.
+
+        Given the key of a property the string is a value of, a new string is only
+        interned while fewer than values_per_key strings were interned for that key,
+        None is returned otherwise.
+        """
+        code = self.codes.get(string)
+        if code is None:
+            with self._lock:
+                code = self.codes.get(string)
+                if code is None:
+                    if key is not None:
+                        count = self._key_counts.get(key, 0)
+                        if count >= self.values_per_key:
+                            return None
+                        self._key_counts[key] = count + 1
+                    code = len(self.strings)
+                    self.strings.append(string)
+                    self.codes[string] = code
+        return code
+
+    def find_code(self, string):
+        """Returns the code of a string, or None if the string was never interned."""
+        return self.codes.get(string)
+
+    def string(self, code):
+        return self.strings[code]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+# shared by all nodes and edges of the process
+STRINGS = StringTable()
+
+
+class PropertyElement(object):
+    """Base class of Node and Edge storing arbitrary properties without a per-instance dict.
+
+    The fixed fields of a subclass are declared in its __slots__ (and listed in
+    CORE_FIELDS in the order they are reported). All other properties live in
+    _properties, a tuple of alternating key and value codes (a tuple is smaller
+    than an array for the handful of properties an element has). A value code >= 0
+    refers to a string in STRINGS, a negative code -(i + 1) to the non-string
+    value (or the string STRINGS had no room for) _other_properties[i].
+
+    An element that belongs to a graph reports every change of a field or property
+    to it (see Graph._element_changed), so the graph can keep its indexes current.
+    """
+
+    __slots__ = ('_properties', '_other_properties', '_graph')
+
+    CORE_FIELDS = ()
+
+    def _init_properties(self, properties):
+        object.__setattr__(self, '_properties', ())
+        object.__setattr__(self, '_other_properties', None)
+        object.__setattr__(self, '_graph', None)
+        for (key, value) in properties.items():
+            setattr(self, key, value)
+
+    def _find_property(self, key):
+        """Returns the position of the key code in _properties, or -1."""
+        key_code = STRINGS.find_code(key)
+        if key_code is None:
+            return -1
+        codes = self._properties
+        for i in range(0, len(codes), 2):
+            if codes[i] == key_code:
+                return i
+        return -1
+
+    def _decode(self, value_code):
+        if value_code >= 0:
+            return STRINGS.string(value_code)
+        return self._other_properties[-value_code - 1]
+
+    def _encode(self, key, value, old_value_code=None):
+        if type(value) is str:
+            code = STRINGS.code(value, key)
+            if code is not None:
+                if old_value_code is not None and old_value_code < 0:
+                    self._other_properties[-old_value_code - 1] = None
+                return code
+
+        if old_value_code is not None and old_value_code < 0:
+            # reuse the slot of the previous non-string value
+            self._other_properties[-old_value_code - 1] = value
+            return old_value_code
+
+        if self._other_properties is None:
+            object.__setattr__(self, '_other_properties', [])
+        self._other_properties.append(value)
+        return -len(self._other_properties)
+
+    @staticmethod
+    def _load_columns(elements, columns):
+        """Sets the properties of new elements, not yet in a graph, from columns.
+
+        This is the bulk version of setting them one by one (see Graph.load_snapshot).
+
+        :param elements: The elements, without properties.
+        :param columns: (key, values) pairs, one value per element, None where it is missing.
+        """
+        codes = [[] for element in elements]
+        others = [None] * len(elements)
+        for (key, values) in columns:
+            key_code = STRINGS.code(key)
+            for (i, value) in enumerate(values):
+                if value is None:
+                    continue
+                value_code = STRINGS.code(value, key) if type(value) is str else None
+                if value_code is None:
+                    if others[i] is None:
+                        others[i] = []
+                    others[i].append(value)
+                    value_code = -len(others[i])
+                codes[i].append(key_code)
+                codes[i].append(value_code)
+        for (element, element_codes, element_others) in zip(elements, codes, others):
+            object.__setattr__(element, '_properties', tuple(element_codes))
+            object.__setattr__(element, '_other_properties', element_others)
+
+    def _get_property(self, key, default=_MISSING):
+        if key in self.CORE_FIELDS:
+            return getattr(self, key, default)
+        i = self._find_property(key)
+        if i < 0:
+            return default
+        return self._decode(self._properties[i + 1])
+
+    def _set_property(self, key, value):
+        codes = self._properties
+        i = self._find_property(key)
+        if i < 0:
+            codes = codes + (STRINGS.code(key), self._encode(key, value))
+        else:
+            codes = codes[:i + 1] + (self._encode(key, value, codes[i + 1]),) + codes[i + 2:]
+        object.__setattr__(self, '_properties', codes)
+
+    def __getattr__(self, key):
+        # only called when regular lookup failed, i.e. for properties and unset slots
+        if key.startswith('_') or key in self.CORE_FIELDS:
+            raise AttributeError(key)
+        i = self._find_property(key)
+        if i < 0:
+            raise AttributeError(key)
+        return self._decode(self._properties[i + 1])
+
+    def __setattr__(self, key, value):
+        """Sets a field or property, reporting a change of it to the graph of the element.
+
+        >>> import h3graph
+        >>> graph = h3graph.Graph()
+        >>> node = graph.add_new_node(1, status='Alive')
+        >>> version = graph.version
+        >>> node.status = 'Alive'
+        >>> graph.version == version
+        True
+        >>> node.status = 'Deceased'
+        >>> graph.version == version + 1
+        True
+        """
+        graph = self._graph
+        if graph is not None:
+            old_value = self._get_property(key)
+            if old_value is value or (type(old_value) is type(value) and old_value == value):
+                # nothing changed, the graph's version and indexes stay valid
+                return
+            if old_value is _MISSING:
+                old_value = None
+
+        if key in self.CORE_FIELDS:
+            object.__setattr__(self, key, value)
+        else:
+            self._set_property(key, value)
+
+        if graph is not None:
+            graph._element_changed(self, key, old_value, value)
+
+    def __delattr__(self, key):
+        old_value = self._get_property(key, None)
+        if key in self.CORE_FIELDS:
+            object.__delattr__(self, key)
+        else:
+            i = self._find_property(key)
+            if i < 0:
+                raise AttributeError(key)
+            value_code = self._properties[i + 1]
+            if value_code < 0:
+                self._other_properties[-value_code - 1] = None
+            object.__setattr__(self, '_properties', self._properties[:i] + self._properties[i + 2:])
+
+        if self._graph is not None:
+            self._graph._element_changed(self, key, old_value, None)
+
+    def get_properties(self):
+        """Returns the set core fields followed by the properties as a new dict."""
+        result = dict()
+        for field in self.CORE_FIELDS:
+            value = getattr(self, field, _MISSING)
+            if value is not _MISSING:
+                result[field] = value
+        codes = self._properties
+        for i in range(0, len(codes), 2):
+            result[STRINGS.string(codes[i])] = self._decode(codes[i + 1])
+        return result
+
+    def _has_all_properties(self, properties):
+        for (key, value) in properties.items():
+            current = self._get_property(key)
+            if current is _MISSING or value != current:
+                return False
+        return True
+
+    def __getstate__(self):
+        # codes are only valid within this process, pickle the decoded values
+        return self.get_properties()
+
+    def __setstate__(self, state):
+        self._init_properties(state)
@@ -0,0 +1,377 @@
+"""An HTTP service drawing views of a graph that is loaded once.
+
+    $ python -m h3graph.service got.graphml --port 8080
+
+GET /graph.svg draws the whole graph, the query parameters select a view of it:
+    node=KEY:VALUE          nodes with the property, e.g. node=house-birth:House Stark;
+                            several values of one key mean any of them
+    exclude_node=KEY:VALUE  no nodes with the property
+    edge=KEY:VALUE, exclude_edge=KEY:VALUE
+                            likewise for the edges, e.g. exclude_edge=relation:father
+    focus=ID|NAME           only the character and its neighbourhood
+    depth=K                 the size of the neighbourhood in hops (default 1)
+    layout=circular|force   lay the view out on its own instead of keeping the positions
+                            of the whole graph
+GET /stats returns the size of the graph and the counters of the response cache as JSON.
+
+The drawings are made by worker processes (see batch.render_variants), so the event loop
+keeps serving while they run and several drawings are made at once. They are cached by
+the version of the graph and the parameters.
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import http
+import io
+import json
+import logging
+import urllib.parse
+
+import h3graph
+import h3graph.draw as draw
+import h3graph.instrument as instrument
+from h3graph.batch import Variant, draw_variant, filters_from_spec, process_pool
+from h3graph.layout import get_layout
+from h3graph.views import PropertyFilter
+
+HOST = "127.0.0.1"
+PORT = 8080
+CACHE_BYTES = 256 * 1024 * 1024     # size of the response cache
+MAX_HEADER_LINES = 100              # of a request, longer requests are refused
+
+# the graph and its images, set in every worker process by init_worker
+_worker_state = None
+
+
+class ResponseCache(object):
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        """A least recently used cache of responses that holds at most max_bytes of them.
+
+        >>> cache = ResponseCache(max_bytes=10)
+        >>> cache.put('a', b'123456'), cache.put('b', b'1234'), cache.get('a')
+        (None, None, b'123456')
+        >>> cache.put('c', b'12'), cache.get('b'), cache.size
+        (None, None, 8)
+        >>> cache.hits, cache.misses
+        (1, 1)
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._responses = collections.OrderedDict()
+
+    def get(self, key):
+        response = self._responses.get(key)
+        if response is None:
+            self.misses = self.misses + 1
+            return None
+        self.hits = self.hits + 1
+        self._responses.move_to_end(key)
+        return response
+
+    def put(self, key, response):
+        if len(response) > self.max_bytes:
+            return
+        if key in self._responses:
+            self.size = self.size - len(self._responses.pop(key))
+        self._responses[key] = response
+        self.size = self.size + len(response)
+        while self.size > self.max_bytes:
+            (_, evicted) = self._responses.popitem(last=False)
+            self.size = self.size - len(evicted)
+
+    def __len__(self):
+        return len(self._responses)
+
+
+def parse_properties(values):
+    """The KEY:VALUE parameters as dict, several values of one key as list.
+
+    >>> parse_properties(['status:Alive', 'house-birth:House Stark', 'house-birth:House Tully'])
+    {'status': 'Alive', 'house-birth': ['House Stark', 'House Tully']}
+    """
+    properties = dict()
+    for value in values:
+        (key, separator, property_value) = value.partition(":")
+        if not separator or not key:
+            raise ValueError("expected KEY:VALUE, got %r" % value)
+        if key not in properties:
+            properties[key] = property_value
+        elif isinstance(properties[key], list):
+            properties[key].append(property_value)
+        else:
+            properties[key] = [properties[key], property_value]
+    return properties
+
+
+def find_character(graph, id_or_name):
+    """The node with the id or, failing that, the name."""
+    try:
+        node = graph.find_node_by_id(int(id_or_name))
+        if node is not None:
+            return node
+    except ValueError:
+        pass
+    matches = graph.query_nodes(name=id_or_name)
+    return matches[0] if matches else None
+
+
+def variant_from_query(graph, query):
+    """The Variant (without output) described by the query parameters
+    (see the module documentation).
+
+    :param graph: The graph, to find the focus character and its neighbourhood in.
+    :param query: The parameters, as dict of lists (see urllib.parse.parse_qs).
+    :raises ValueError: On unknown or malformed parameters.
+    :raises LookupError: If there is no focus character of that id or name.
+    """
+    unknown = set(query) - {"node", "exclude_node", "edge", "exclude_edge",
+                            "focus", "depth", "layout"}
+    if unknown:
+        raise ValueError("unknown parameters: %s" % ", ".join(sorted(unknown)))
+
+    node_filters = filters_from_spec(parse_properties(query.get("node", [])),
+                                     parse_properties(query.get("exclude_node", [])))
+    edge_filters = filters_from_spec(parse_properties(query.get("edge", [])),
+                                     parse_properties(query.get("exclude_edge", [])))
+
+    if "focus" in query:
+        focus = find_character(graph, query["focus"][-1])
+        if focus is None:
+            raise LookupError("no character %r" % query["focus"][-1])
+        depth = int(query.get("depth", ["1"])[-1])
+        if depth < 0:
+            raise ValueError("depth must not be negative")
+        ids = [focus.id] + [n.id for n in graph.get_neighbourhood_of(focus, depth)]
+        node_filters.append(PropertyFilter("id", ids))
+
+    layout = query.get("layout", [None])[-1]
+    if layout is not None:
+        get_layout(layout)     # raises ValueError for unknown layouts
+    return Variant(None, node_filters, edge_filters, layout)
+
+
+def init_worker(graph, image_hrefs):
+    global _worker_state
+    _worker_state = (graph, image_hrefs)
+
+
+def render(variant):
+    """Draws a variant in a worker set up by init_worker
+    and returns the svg document, utf-8 encoded."""
+    (graph, image_hrefs) = _worker_state
+    output = io.StringIO()
+    draw_variant(graph, variant, output, image_hrefs)
+    return output.getvalue().encode("utf-8")
+
+
+class RenderService(object):
+
+    def __init__(self, graph, workers=None, processes=True, cache_bytes=CACHE_BYTES):
+        """Serves drawings of views of a laid out graph (see the module documentation).
+
+        The images of the characters are loaded once. The drawings are made by a pool of
+        worker processes that get the graph when they are started; if the graph has been
+        changed since, the pool is replaced on the next request. Concurrent requests for
+        the same drawing wait for the same result.
+
+        :param graph: The graph, with node positions.
+        :param workers: The number of worker processes, None for one per CPU.
+        :param processes: Whether to draw in worker processes, otherwise the drawings are
+                          made one after another by a single thread.
+        :param cache_bytes: The size of the response cache.
+        """
+        self.graph = graph
+        self.workers = workers
+        self.processes = processes
+        self.cache = ResponseCache(cache_bytes)
+        self.image_hrefs = draw.load_character_images(graph, draw.IMAGE_SIZE, draw.IMAGE_WORKERS,
+                                                      draw.IMAGE_PROCESSES)
+        self._executor = None
+        self._executor_version = None
+        self._pending = dict()
+        self.rendered = 0
+
+    def executor(self):
+        version = (self.graph.version, self.graph.layout_version)
+        if self._executor is not None and self._executor_version == version:
+            return self._executor
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+        if self.processes:
+            self._executor = process_pool(self.workers, init_worker, (self.graph, self.image_hrefs))
+        else:
+            # the drawing code keeps module level state, so one drawing at a time
+            init_worker(self.graph, self.image_hrefs)
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._executor_version = version
+        return self._executor
+
+    async def render(self, query):
+        """The svg document for the query parameters (a dict of lists), utf-8 encoded.
+
+        A view with a layout of its own leaves the graph as it is, so the responses cached
+        before stay valid:
+
+        >>> graph = h3graph.Graph()
+        >>> nodes = [graph.add_new_node(i) for i in range(1000, 1006)]
+        >>> for (a, b) in zip(nodes, nodes[1:]):
+        ...     edge = graph.add_new_edge(a, b)
+        >>> graph.define_node_positions('circular')
+        >>> graph.update_graph()
+        >>> service = RenderService(graph, processes=False)
+        >>> for query in ({}, {'layout': ['force']}, {}):
+        ...     response = asyncio.run(service.render(query))
+        >>> service.cache.hits, service.cache.misses, service.rendered
+        (1, 2, 2)
+        >>> service.executor().shutdown()
+        """
+        variant = variant_from_query(self.graph, query)
+        key = (self.graph.version, self.graph.layout_version,
+               tuple(sorted((name, tuple(values)) for (name, values) in query.items())))
+
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+
+        loop = asyncio.get_running_loop()
+        pending = loop.run_in_executor(self.executor(), render, variant)
+        self._pending[key] = pending
+        try:
+            response = await asyncio.shield(pending)
+        finally:
+            del self._pending[key]
+        self.cache.put(key, response)
+        self.rendered = self.rendered + 1
+        instrument.count("responses_rendered", self.rendered)
+        return response
+
+    def stats(self):
+        return {"nodes": len(self.graph.nodes), "edges": len(self.graph.edges),
+                "version": self.graph.version, "layout_version": self.graph.layout_version,
+                "rendered": self.rendered,
+                "cache": {"responses": len(self.cache), "bytes": self.cache.size,
+                          "hits": self.cache.hits, "misses": self.cache.misses}}
+
+    async def handle(self, reader, writer):
+        # one request per connection
+        try:
+            (status, target) = await self.read_request(reader)
+            if status is not None:
+                await self.respond(writer, status)
+            else:
+                await self.route(writer, target)
+        except Exception:
+            instrument.logger.exception("request failed")
+            await self.respond(writer, http.HTTPStatus.INTERNAL_SERVER_ERROR)
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def read_request(reader):
+        """Reads the request line and skips the headers.
+
+        :return: (None, target) for a GET of target, (status, None) with the error status
+                 of a request that is not served.
+        """
+        request_line = (await reader.readline()).decode("latin-1")
+        for _ in range(0, MAX_HEADER_LINES):
+            if (await reader.readline()) in (b"\r\n", b"\n", b""):
+                break
+        else:
+            return (http.HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, None)
+
+        parts = request_line.split()
+        if len(parts) != 3:
+            return (http.HTTPStatus.BAD_REQUEST, None)
+        (method, target, _) = parts
+        if method != "GET":
+            return (http.HTTPStatus.METHOD_NOT_ALLOWED, None)
+        return (None, target)
+
+    async def route(self, writer, target):
+        """Answers a GET of target: the drawing of a view, the stats or not found."""
+        url = urllib.parse.urlsplit(target)
+        if url.path in ("/", "/graph.svg"):
+            await self.respond_drawing(writer, urllib.parse.parse_qs(url.query))
+        elif url.path == "/stats":
+            await self.respond(writer, http.HTTPStatus.OK,
+                               json.dumps(self.stats()).encode("utf-8"), "application/json")
+        else:
+            await self.respond(writer, http.HTTPStatus.NOT_FOUND)
+
+    async def respond_drawing(self, writer, query):
+        try:
+            body = await self.render(query)
+        except ValueError as e:
+            await self.respond(writer, http.HTTPStatus.BAD_REQUEST, str(e).encode("utf-8"))
+        except LookupError as e:
+            await self.respond(writer, http.HTTPStatus.NOT_FOUND, str(e).encode("utf-8"))
+        else:
+            await self.respond(writer, http.HTTPStatus.OK, body, "image/svg+xml")
+
+    @staticmethod
+    async def respond(writer, status, body=None, content_type="text/plain; charset=utf-8"):
+        if body is None:
+            body = status.phrase.encode("utf-8")
+        header = ("HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n"
+                  "Connection: close\r\n\r\n"
+                  % (status.value, status.phrase, content_type, len(body)))
+        writer.write(header.encode("latin-1"))
+        writer.write(body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def serve(self, host=HOST, port=PORT):
+        """Serves requests until cancelled."""
+        server = await asyncio.start_server(self.handle, host, port)
+        instrument.logger.info("serving on http://%s:%d/graph.svg", host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves drawings of views of a graph over HTTP.")
+    parser.add_argument("graph", help="the GraphML file")
+    parser.add_argument("--host", default=HOST,
+                        help="the address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=PORT,
+                        help="the port to listen on (default: %(default)s)")
+    parser.add_argument("--layout", default="circular",
+                        help="the layout of the whole graph (circular or force)")
+    parser.add_argument("--pin", metavar="ID", type=int, action="append", default=[],
+                        help="a node placed on the outer circle although it has more than one edge")
+    parser.add_argument("--workers", type=int,
+                        help="the number of worker processes (default: one per CPU)")
+    parser.add_argument("--cache-mb", type=int, default=CACHE_BYTES // (1024 * 1024),
+                        help="the size of the response cache in MB (default: %(default)s)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    graph = h3graph.Graph(pinned_node_ids=args.pin)
+    graph.load(args.graph)
+    graph.define_node_positions(args.layout)
+    graph.update_graph()
+
+    service = RenderService(graph, args.workers, cache_bytes=args.cache_mb * 1024 * 1024)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+import json
+import mmap
+import struct
+
+import numpy as np
+
+MAGIC = b"H3GSNAP1"
+VERSION = 1
+ALIGNMENT = 8
+
+# property columns: the values of one property of all nodes (or edges)
+#   str:   int32 codes into the string table, -1 where the property is missing
+#   int, float, bool: the values, plus a uint8 mask of where the property is set
+# properties with values of mixed types are stored as strings, and so are the node ids
+# unless all of them are ints
+PROPERTY_KINDS = {
+    "int": np.dtype("<i8"),
+    "float": np.dtype("<f8"),
+    "bool": np.dtype("u1"),
+}
+
+
+def property_kind(values):
+    """The column kind of the given (not None) property values.
+
+    >>> property_kind([1, 2]), property_kind([1.5, 2])
+    ('int', 'float')
+    >>> property_kind(['a', 2]), property_kind([True])
+    ('str', 'bool')
+    """
+    types = set(type(v) for v in values)
+    if types == {bool}:
+        return "bool"
+    if types == {int}:
+        return "int"
+    if types and types <= {int, float}:
+        return "float"
+    return "str"
+
+
+class StringTableBuilder(object):
+
+    def __init__(self):
+        self.codes = dict()
+
+    def code(self, string):
+        code = self.codes.get(string)
+        if code is None:
+            code = len(self.codes)
+            self.codes[string] = code
+        return code
+
+    def columns(self):
+        blob = b"".join(s.encode("utf-8") for s in self.codes)
+        offsets = np.zeros(len(self.codes) + 1, dtype="<i8")
+        offsets[1:] = np.cumsum([len(s.encode("utf-8")) for s in self.codes])
+        return (np.frombuffer(blob, dtype="u1"), offsets)
+
+
+def property_columns(prefix, elements, strings):
+    """Builds the columns of all properties of the elements, returns (specs, columns)."""
+    values_by_key = dict()
+    for (i, element) in enumerate(elements):
+        properties = element.get_properties()
+        for field in element.CORE_FIELDS:
+            properties.pop(field, None)
+        for (key, value) in properties.items():
+            if value is not None:
+                values_by_key.setdefault(key, dict())[i] = value
+
+    specs = []
+    columns = dict()
+    count = len(elements)
+    for (key, values) in values_by_key.items():
+        kind = property_kind(values.values())
+        name = "%s.%s" % (prefix, key)
+        positions = np.fromiter(values.keys(), dtype=np.int64, count=len(values))
+        if kind == "str":
+            column = np.full(count, -1, dtype="<i4")
+            column[positions] = [strings.code(str(v)) for v in values.values()]
+            columns[name] = column
+            specs.append({"key": key, "kind": kind, "column": name})
+        else:
+            column = np.zeros(count, dtype=PROPERTY_KINDS[kind])
+            column[positions] = list(values.values())
+            mask = np.zeros(count, dtype="u1")
+            mask[positions] = 1
+            columns[name] = column
+            columns[name + ".set"] = mask
+            specs.append({"key": key, "kind": kind, "column": name, "mask": name + ".set"})
+    return (specs, columns)
+
+
+def write_snapshot(graph, path, include_layout=True):
+    """Writes the graph to a binary snapshot (see Snapshot for the layout of the file)."""
+    strings = StringTableBuilder()
+    columns = dict()
+    nodes = graph.nodes
+    edges = graph.edges
+
+    if all(type(node.id) is int for node in nodes):
+        node_id_kind = "int"
+        columns["node.id"] = np.array([node.id for node in nodes], dtype="<i8")
+    else:
+        node_id_kind = "str"
+        columns["node.id"] = np.array([strings.code(str(node.id)) for node in nodes], dtype="<i4")
+
+    index = dict((id(node), i) for (i, node) in enumerate(nodes))
+    columns["edge.source"] = np.array([index[id(e.sourceNode)] for e in edges], dtype="<i8")
+    columns["edge.target"] = np.array([index[id(e.targetNode)] for e in edges], dtype="<i8")
+    columns["edge.directed"] = np.array([bool(e.directed) for e in edges], dtype="u1")
+
+    if include_layout:
+        # NaN for nodes without position
+        columns["node.x"] = np.array([node.get("x") for node in nodes], dtype="<f8")
+        columns["node.y"] = np.array([node.get("y") for node in nodes], dtype="<f8")
+
+    (node_properties, node_columns) = property_columns("node", nodes, strings)
+    (edge_properties, edge_columns) = property_columns("edge", edges, strings)
+    columns.update(node_columns)
+    columns.update(edge_columns)
+
+    (columns["strings.data"], columns["strings.offsets"]) = strings.columns()
+
+    column_specs = dict()
+    offset = 0
+    for (name, column) in columns.items():
+        column_specs[name] = {"dtype": column.dtype.str, "count": len(column), "offset": offset}
+        offset = offset + padded(column.nbytes)
+
+    header = json.dumps({
+        "version": VERSION,
+        "node_count": len(nodes),
+        "edge_count": len(edges),
+        "node_id_kind": node_id_kind,
+        "layout": include_layout,
+        "node_properties": node_properties,
+        "edge_properties": edge_properties,
+        "columns": column_specs,
+    }).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(b"\0" * (padded(f.tell()) - f.tell()))
+        for column in columns.values():
+            data = column.tobytes()
+            f.write(data)
+            f.write(b"\0" * (padded(len(data)) - len(data)))
+
+
+def degrees(sources, targets, count):
+    """Returns the degrees of count nodes given the source and target columns of the edges,
+    and the nodes having an edge in the order of their first one (its source before its target).
+
+    >>> degrees(np.array([2, 0, 3]), np.array([0, 1, 3]), 5)
+    ([2, 1, 1, 2, 0], [2, 0, 1, 3])
+    """
+    ends = np.empty(2 * len(sources), dtype=np.int64)
+    ends[0::2] = sources
+    ends[1::2] = targets
+    (touched, first) = np.unique(ends, return_index=True)
+    return (np.bincount(ends, minlength=count).tolist(), touched[np.argsort(first)].tolist())
+
+
+def padded(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class Snapshot(object):
+
+    def __init__(self, path):
+        """A memory mapped graph snapshot.
+
+        The file starts with MAGIC, the length of the JSON header and the header itself.
+        It is followed by 8 byte aligned column arrays: node ids, edge source and target
+        indexes into the nodes and directed flags, optionally the x and y layout, one
+        column per property (string values as codes into the string table) and the
+        string table as utf-8 data plus offsets. The columns are views into the mapped
+        file, only the pages of the columns that are read are loaded.
+
+        :param path: The file written by Graph.save_snapshot.
+        """
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[0:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("Not a graph snapshot: %s" % path)
+        (header_length,) = struct.unpack_from("<Q", self._map, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = self._map[header_start:header_start + header_length]
+        self.header = json.loads(header.decode("utf-8"))
+        if self.header["version"] != VERSION:
+            self.close()
+            raise ValueError("Unsupported snapshot version: %s" % self.header["version"])
+        self._data_start = padded(header_start + header_length)
+        self._strings = None
+
+    def has_column(self, name):
+        return name in self.header["columns"]
+
+    def column(self, name):
+        spec = self.header["columns"][name]
+        return np.frombuffer(self._map, dtype=np.dtype(spec["dtype"]), count=spec["count"],
+                             offset=self._data_start + spec["offset"])
+
+    def strings(self):
+        """The decoded string table."""
+        if self._strings is None:
+            data = self.column("strings.data").tobytes()
+            offsets = self.column("strings.offsets").tolist()
+            self._strings = [data[offsets[i]:offsets[i + 1]].decode("utf-8")
+                             for i in range(0, len(offsets) - 1)]
+        return self._strings
+
+    def node_ids(self):
+        ids = self.column("node.id").tolist()
+        if self.header["node_id_kind"] == "str":
+            strings = self.strings()
+            ids = [strings[code] for code in ids]
+        return ids
+
+    def values(self, spec):
+        """Decodes a property column into one value per element, None where it is missing."""
+        values = self.column(spec["column"]).tolist()
+        if spec["kind"] == "str":
+            strings = self.strings()
+            return [strings[code] if code >= 0 else None for code in values]
+        convert = bool if spec["kind"] == "bool" else (lambda v: v)
+        mask = self.column(spec["mask"]).tolist()
+        return [convert(value) if is_set else None for (value, is_set) in zip(values, mask)]
+
+    def properties(self, specs, count):
+        """Decodes property columns into one dict per element."""
+        result = [dict() for i in range(0, count)]
+        for spec in specs:
+            for (i, value) in enumerate(self.values(spec)):
+                if value is not None:
+                    result[i][spec["key"]] = value
+        return result
+
+    def node_properties(self):
+        return self.properties(self.header["node_properties"], self.header["node_count"])
+
+    def edge_properties(self):
+        return self.properties(self.header["edge_properties"], self.header["edge_count"])
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,65 @@
+import math
+
+
+def overlaps(a, b):
+    """Whether the boxes (x0, y0, x1, y1) overlap (touching borders do not count)."""
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class GridIndex(object):
+
+    def __init__(self, cell_size):
+        """A uniform grid over bounding boxes: each item is filed under every cell its box overlaps.
+
+        >>> index = GridIndex(10)
+        >>> index.insert(0, (1, 1, 5, 5))
+        >>> index.insert(1, (8, 8, 25, 12))
+        >>> sorted(index.query((0, 0, 10, 10))), sorted(index.query((20, 0, 30, 10)))
+        ([0, 1], [1])
+        >>> sorted(index.query((0, 20, 10, 30)))
+        []
+
+        :param cell_size: The width and height of the cells.
+        """
+        self.cell_size = cell_size
+        self.cells = dict()
+
+    def _cell_range(self, box):
+        (x0, y0, x1, y1) = box
+        size = self.cell_size
+        return (range(int(math.floor(x0 / size)), int(math.floor(x1 / size)) + 1),
+                range(int(math.floor(y0 / size)), int(math.floor(y1 / size)) + 1))
+
+    def insert(self, item, box):
+        """Adds an item with the bounding box (x0, y0, x1, y1)."""
+        (columns, rows) = self._cell_range(box)
+        for column in columns:
+            for row in rows:
+                self.cells.setdefault((column, row), []).append(item)
+
+    def query(self, box):
+        """The items in the cells the box overlaps, each once.
+
+        For boxes aligned to the cells these are exactly the items whose boxes overlap it
+        (the right and bottom border excluded).
+        """
+        result = set()
+        for items in self.iter_cells(box):
+            result.update(items)
+        return result
+
+    def iter_cells(self, box):
+        """Yields the item lists of the cells the box overlaps, one cell after the other.
+
+        An item is in every cell its box overlaps, so it can be yielded more than once.
+        Unlike query this lets a caller stop early.
+        """
+        (x0, y0, x1, y1) = box
+        # the cells the box ends in are not part of it when it ends on their border
+        (columns, rows) = self._cell_range((x0, y0, math.nextafter(x1, x0), math.nextafter(y1, y0)))
+        cells = self.cells
+        for column in columns:
+            for row in rows:
+                items = cells.get((column, row))
+                if items is not None:
+                    yield items
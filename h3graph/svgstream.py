@@ -0,0 +1,167 @@
+import gzip
+import io
+
+import svgwrite
+
+XML_HEADER = '<?xml version="1.0" encoding="utf-8" ?>\n'
+GZIP_LEVEL = 6      # compression of .svgz outputs, higher levels take much longer for little gain
+
+
+class StreamingDefs(object):
+    """The defs attribute of a StreamingDrawing, writes each definition immediately."""
+
+    def __init__(self, drawing):
+        self.drawing = drawing
+
+    def add(self, element):
+        return self.drawing.add_def(element)
+
+
+class StreamingDrawing(object):
+
+    def __init__(self, output, size=('100%', '100%'), **extra):
+        """Writes an SVG document element by element instead of building it in memory.
+
+        Supports the parts of svgwrite.Drawing used by h3graph.draw: drawing.add(),
+        drawing.defs.add() and the element factories (drawing.path(), drawing.use(), ...).
+        Everything that is added is serialised right away and not kept. Definitions
+        added after the first element go into a further <defs> block, references
+        to them are valid anywhere in the document.
+
+        :param output: A file name or a writable text stream. Files named *.svgz are
+                       gzip compressed while they are written.
+        :param size: The width and height of the document.
+        :param extra: Further svg attributes, as for svgwrite.Drawing.
+
+        >>> stream = io.StringIO()
+        >>> drawing = StreamingDrawing(stream, size=('10mm', '10mm'), debug=False)
+        >>> marker = drawing.defs.add(drawing.marker(id='arrow'))
+        >>> line = drawing.add(drawing.line(start=(0, 0), end=(1, 1)))
+        >>> drawing.close()
+        >>> stream.getvalue().partition('xlink">')[2]
+        '<defs><marker id="arrow" /></defs><line x1="0" x2="1" y1="0" y2="1" /></svg>'
+
+        >>> stream = io.StringIO()
+        >>> drawing = StreamingDrawing(stream, debug=False)
+        >>> line = drawing.add(drawing.line(start=(0, 0), end=(1, 1)))
+        >>> marker = drawing.defs.add(drawing.marker(id='arrow'))
+        >>> drawing.close()
+        >>> stream.getvalue().partition('xlink">')[2]
+        '<defs /><line x1="0" x2="1" y1="0" y2="1" /><defs><marker id="arrow" /></defs></svg>'
+        """
+        # the svgwrite drawing is only used as element factory and for the <svg> tag
+        self._factory = svgwrite.Drawing(size=size, **extra)
+
+        if isinstance(output, str) and output.endswith('.svgz'):
+            self.stream = gzip.open(output, mode='wt', encoding='utf-8', compresslevel=GZIP_LEVEL)
+            self._close_stream = True
+        elif isinstance(output, str):
+            self.stream = io.open(output, mode='w', encoding='utf-8')
+            self._close_stream = True
+        else:
+            self.stream = output
+            self._close_stream = False
+
+        self.defs = StreamingDefs(self)
+        self._in_defs = False
+        self._in_body = False
+        self.closed = False
+        self.chars_written = 0
+
+        # an empty drawing serialises as <svg ...><defs /></svg>
+        empty_document = self._factory.tostring()
+        self._svg_start = empty_document[:empty_document.index('<defs />')]
+        self._svg_end = '</svg>'
+        self.write(XML_HEADER)
+        self.write(self._svg_start)
+
+    def __getattr__(self, name):
+        # element factory methods of svgwrite.Drawing
+        return getattr(self._factory, name)
+
+    def write(self, string):
+        self.stream.write(string)
+        self.chars_written = self.chars_written + len(string)
+
+    def add_def(self, element):
+        if not self._in_defs:
+            self.write('<defs>')
+            self._in_defs = True
+        self.write(element.tostring())
+        return element
+
+    def _end_defs(self):
+        if self._in_defs:
+            self.write('</defs>')
+        elif not self._in_body:
+            # like svgwrite, a document always starts with a <defs> element
+            self.write('<defs />')
+        self._in_defs = False
+        self._in_body = True
+
+    def add_def_fragment(self, fragment):
+        """Writes already serialised definitions,
+        e.g. the definitions recorded by a FragmentRecorder."""
+        if not self._in_defs:
+            self.write('<defs>')
+            self._in_defs = True
+        self.write(fragment)
+
+    def add(self, element):
+        self._end_defs()
+        self.write(element.tostring())
+        return element
+
+    def add_fragment(self, fragment):
+        """Writes already serialised elements, e.g. the content of a FragmentRecorder."""
+        if fragment:
+            self._end_defs()
+            self.write(fragment)
+
+    def close(self):
+        if self.closed:
+            return
+        self._end_defs()
+        self.write(self._svg_end)
+        self.closed = True
+        if self._close_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FragmentRecorder(object):
+
+    def __init__(self, drawing):
+        """Serialises the elements added to it instead of drawing them.
+
+        Drawing functions written against a drawing can produce an svg fragment this way,
+        definitions (drawing.defs.add()) are recorded like all other elements.
+        Element factories are taken from the wrapped drawing.
+
+        >>> recorder = FragmentRecorder(svgwrite.Drawing(debug=False))
+        >>> line = recorder.add(recorder.line(start=(0, 0), end=(1, 1)))
+        >>> recorder.getvalue()
+        '<line x1="0" x2="1" y1="0" y2="1" />'
+        """
+        self.drawing = drawing
+        self.defs = StreamingDefs(self)
+        self.parts = []
+
+    def __getattr__(self, name):
+        return getattr(self.drawing, name)
+
+    def add(self, element):
+        self.parts.append(element.tostring())
+        return element
+
+    add_def = add
+
+    def getvalue(self):
+        return ''.join(self.parts)
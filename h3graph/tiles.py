@@ -0,0 +1,188 @@
+import json
+import math
+import os
+import shutil
+
+import h3graph.centrality as centrality
+import h3graph.draw as draw
+from h3graph.geometry import EdgeGeometry
+from h3graph.spatial import GridIndex, overlaps
+from h3graph.svgstream import StreamingDrawing
+from svgwrite.text import Text
+
+TILE_SIZE = 512         # pixels of a tile
+ZOOM_LEVELS = 4         # zoom z covers the canvas with 2**z tiles in its longer direction
+LABEL_MIN_ZOOM = 2      # names and houses are only written from this zoom on
+PORTRAIT_MIN_ZOOM = 2   # portraits likewise, nodes are plain circles below
+
+# estimated extent of the texts, for their bounding boxes
+LABEL_CHAR_WIDTH = 10
+HEADLINE = "Game  of  Thrones"
+HEADLINE_INSERT = (draw.WIDTH / 2 + 50, 300)
+HEADLINE_FONT_SIZE = 192    # 12em, see assets/css/got-font.css
+
+EDGE_MARGIN = draw.NODE_RADIUS + 10     # stroke width and the arrow marker around the end point
+
+
+def node_box(node):
+    x = draw.OFFSET_X + node.x
+    y = draw.OFFSET_Y + node.y
+    characters = max(len(str(node.get("name") or "")), len(str(node.get("house-birth") or "")))
+    label_width = characters * LABEL_CHAR_WIDTH
+    half_width = max(draw.NODE_RADIUS + 20, label_width / 2)   # 20: the death symbol
+    return (x - half_width, y - draw.NODE_RADIUS,
+            x + half_width, y + draw.NODE_RADIUS + 3 * draw.SCALE)
+
+
+def edge_box(start, end, control=None):
+    """The bounding box of an edge, a line if control is None or a quadratic bezier.
+
+    >>> edge_box((0, 0), (100, 50), (50, 200))[3] - EDGE_MARGIN
+    200
+    >>> edge_box((0, 0), (100, 50))[3] - EDGE_MARGIN
+    50
+    """
+    if control is None:
+        xs = (start[0], end[0])
+        ys = (start[1], end[1])
+    else:
+        # a quadratic bezier lies within the triangle of its points
+        xs = (start[0], end[0], control[0])
+        ys = (start[1], end[1], control[1])
+    return (min(xs) - EDGE_MARGIN, min(ys) - EDGE_MARGIN,
+            max(xs) + EDGE_MARGIN, max(ys) + EDGE_MARGIN)
+
+
+def headline_box():
+    (x, y) = HEADLINE_INSERT
+    half_width = len(HEADLINE) * HEADLINE_FONT_SIZE * 0.6 / 2
+    return (x - half_width, y - HEADLINE_FONT_SIZE, x + half_width, y + HEADLINE_FONT_SIZE / 4)
+
+
+def tile_grid(zoom):
+    """The side length of the (square) tiles of a zoom level
+    and their number of columns and rows."""
+    side = max(draw.WIDTH, draw.HEIGHT) / (1 << zoom)
+    return (side, int(math.ceil(draw.WIDTH / side)), int(math.ceil(draw.HEIGHT / side)))
+
+
+def remove_tiles(directory):
+    """Removes the zoom level directories an earlier draw_tiles left in directory,
+    other files in it are kept.
+
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> os.makedirs(os.path.join(directory, '5', '0'))
+    >>> open(os.path.join(directory, 'index.html'), 'w').close()
+    >>> remove_tiles(directory)
+    >>> os.listdir(directory)
+    ['index.html']
+    """
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.isdigit() and os.path.isdir(path):
+            shutil.rmtree(path)
+
+
+def draw_tiles(graph, directory, zoom_levels=ZOOM_LEVELS, tile_size=TILE_SIZE, image_hrefs=None):
+    """Draws the graph as a pyramid of tiles, directory/<zoom>/<column>/<row>.svg,
+    and a manifest tiles.json.
+
+    Each tile is an svg document of tile_size pixels showing a square part of the canvas;
+    at zoom z the longer side of the canvas is split into 2**z tiles. Only the nodes and
+    edges whose bounding boxes intersect a tile are written to it, found with a GridIndex
+    whose cells are the tiles of the highest zoom. Below LABEL_MIN_ZOOM and PORTRAIT_MIN_ZOOM
+    the names and portraits are left out, a tile embeds only the portraits of its nodes.
+    Every element is serialised once per level of detail and reused by all tiles.
+    The tiles of an earlier run in directory are removed first (see remove_tiles), so no
+    stale zoom levels or tiles are left behind.
+
+    :param graph: A graph (or GraphView) with node positions.
+    :param directory: The output directory.
+    :param zoom_levels: The number of zoom levels.
+    :param tile_size: The width and height of the tiles in pixels.
+    :param image_hrefs: The images loaded before (see draw.load_character_images).
+    """
+    if image_hrefs is None and zoom_levels > PORTRAIT_MIN_ZOOM:
+        image_hrefs = draw.load_character_images(graph, draw.IMAGE_SIZE, draw.IMAGE_WORKERS,
+                                                 draw.IMAGE_PROCESSES)
+    image_hrefs = image_hrefs or dict()
+    remove_tiles(directory)
+
+    # items: the visible edges followed by the nodes, in drawing order
+    geometry = EdgeGeometry(graph, draw.OFFSET_X, draw.OFFSET_Y, draw.WIDTH, draw.HEIGHT,
+                            draw.NO_PARENTS, draw.NO_SIBLINGS)
+    relevant_edges = centrality.relevant_edges(graph, draw.HIGHLIGHT)
+    (finest_side, _, _) = tile_grid(zoom_levels - 1)
+    index = GridIndex(finest_side)
+    items = []
+    for (e, row, relevant) in zip(graph.edges, geometry.rows(), relevant_edges):
+        (visible, straight, start, end, control) = row
+        if visible:
+            index.insert(len(items), edge_box(start, end, None if straight else control))
+            items.append((e, row, relevant))
+    for n in graph.nodes:
+        index.insert(len(items), node_box(n))
+        items.append((n, None, None))
+
+    fragments = dict()
+    levels = []
+    for zoom in range(0, zoom_levels):
+        (side, columns, rows) = tile_grid(zoom)
+        labels = zoom >= LABEL_MIN_ZOOM
+        portraits = zoom >= PORTRAIT_MIN_ZOOM
+        for column in range(0, columns):
+            os.makedirs(os.path.join(directory, str(zoom), str(column)), exist_ok=True)
+            for row in range(0, rows):
+                box = (column * side, row * side, (column + 1) * side, (row + 1) * side)
+                draw_tile(os.path.join(directory, str(zoom), str(column), "%d.svg" % row), box,
+                          tile_size, [items[i] for i in sorted(index.query(box))], labels,
+                          image_hrefs if portraits else dict(), fragments)
+        levels.append({"zoom": zoom, "tile_side": side, "columns": columns, "rows": rows,
+                       "labels": labels, "portraits": portraits})
+
+    with open(os.path.join(directory, "tiles.json"), "w") as f:
+        json.dump({"width": draw.WIDTH, "height": draw.HEIGHT, "tile_size": tile_size,
+                   "path": "{zoom}/{column}/{row}.svg", "levels": levels}, f, indent=2)
+
+
+def draw_tile(output, box, tile_size, items, labels, image_hrefs, fragments):
+    # Draws one tile: the part box of the canvas with the given items (see draw_tiles).
+    # fragments: the serialised items by (item, labels, portraits), shared by all tiles
+    (x0, y0, x1, y1) = box
+    drawing = StreamingDrawing(output, size=(tile_size, tile_size),
+                               viewBox="%s %s %s %s" % (x0, y0, x1 - x0, y1 - y0))
+    with_headline = overlaps(box, headline_box())
+
+    (background_gradient, arrow_marker, death_symbol) = draw.add_static_defs(drawing,
+                                                                             font=with_headline)
+
+    image_ids = sorted([n.id for (n, row, relevant) in items
+                        if row is None and n.id in image_hrefs], key=draw.id_sort_key)
+    image_patterns = draw.character_image_patterns(image_ids)
+    character_images = dict((id, p.get_paint_server())
+                            for (id, p) in zip(image_ids, image_patterns))
+
+    draw.draw_background(drawing, background_gradient)
+    if with_headline:
+        drawing.add(Text(HEADLINE, insert=draw.point(*HEADLINE_INSERT), class_="headline"))
+
+    for (element, row, relevant) in items:
+        if row is not None:
+            key = (id(element),)
+            if key not in fragments:
+                fragments[key] = draw.render_fragment(None, drawing, element, None, draw.draw_edge,
+                                                      element, arrow_marker, row, relevant)
+        else:
+            portrait = element.id in character_images
+            key = (id(element), labels, portrait)
+            if key not in fragments:
+                fragments[key] = draw.render_fragment(None, drawing, element, None, draw.draw_node,
+                                                      element, character_images, death_symbol,
+                                                      labels)
+        drawing.add_fragment(fragments[key])
+
+    draw.add_character_images(drawing, image_patterns, (image_hrefs[id] for id in image_ids))
+    drawing.close()
@@ -0,0 +1,173 @@
+import collections
+
+# number of results Graph keeps of its traversal queries
+TRAVERSAL_CACHE_SIZE = 1024
+
+
+def relation_set(relations):
+    """The relations to follow as frozenset, None follows all of them.
+
+    >>> relation_set('sibling'), relation_set(None), sorted(relation_set(['father', 'mother']))
+    (frozenset({'sibling'}), None, ['father', 'mother'])
+    """
+    if relations is None:
+        return None
+    if isinstance(relations, str):
+        return frozenset((relations,))
+    return frozenset(relations)
+
+
+def steps(graph, node, relations=None, directed=False, backwards=False):
+    """Yields (edge, neighbour) for every edge that can be walked from node, using the
+    incidence lists of the graph. Self loops are skipped.
+
+    :param relations: A frozenset of the relations to follow, None for all.
+    :param directed: Whether directed edges can only be walked from source to target,
+                     undirected edges can always be walked both ways.
+    :param backwards: Yields the edges that lead to node instead (for searches from the target).
+    """
+    if backwards:
+        (along, against) = (graph._in_edges, graph._out_edges)
+    else:
+        (along, against) = (graph._out_edges, graph._in_edges)
+
+    for e in along.get(node.id, ()):
+        neighbour = e.sourceNode if backwards else e.targetNode
+        if neighbour is not node and (relations is None or e.get("relation") in relations):
+            yield (e, neighbour)
+    for e in against.get(node.id, ()):
+        if directed and e.directed:
+            continue
+        neighbour = e.targetNode if backwards else e.sourceNode
+        if neighbour is not node and (relations is None or e.get("relation") in relations):
+            yield (e, neighbour)
+
+
+def bfs(graph, source, relations=None, directed=False, max_depth=None):
+    """Yields (node, depth, edge) in breadth first order, starting with (source, 0, None).
+
+    edge is the edge the node has been reached by.
+    """
+    seen = {source.id}
+    level = [source]
+    depth = 0
+    yield (source, 0, None)
+    while level and (max_depth is None or depth < max_depth):
+        depth = depth + 1
+        next_level = []
+        for node in level:
+            for (e, neighbour) in steps(graph, node, relations, directed):
+                if neighbour.id not in seen:
+                    seen.add(neighbour.id)
+                    next_level.append(neighbour)
+                    yield (neighbour, depth, e)
+        level = next_level
+
+
+def shortest_path(graph, source, target, relations=None, directed=False):
+    """The edges of a shortest path from source to target, None if there is none.
+
+    A bidirectional BFS: the smaller of the two frontiers is expanded by one level
+    until the searches meet, which visits far fewer nodes than a BFS from the source.
+    """
+    if source is target:
+        return []
+
+    # node id -> (edge, node) the node has been reached by, None for the start
+    forward = {source.id: None}
+    backward = {target.id: None}
+    forward_level = [source]
+    backward_level = [target]
+
+    while forward_level and backward_level:
+        backwards = len(backward_level) < len(forward_level)
+        (level, reached, other) = (backward_level, backward, forward) if backwards \
+            else (forward_level, forward, backward)
+
+        next_level = []
+        for node in level:
+            for (e, neighbour) in steps(graph, node, relations, directed, backwards):
+                if neighbour.id in reached:
+                    continue
+                reached[neighbour.id] = (e, node)
+                if neighbour.id in other:
+                    return path_through(neighbour.id, forward, backward)
+                next_level.append(neighbour)
+
+        if backwards:
+            backward_level = next_level
+        else:
+            forward_level = next_level
+
+    return None
+
+
+def path_through(node_id, forward, backward):
+    path = []
+    step = forward[node_id]
+    while step is not None:
+        (e, node) = step
+        path.append(e)
+        step = forward[node.id]
+    path.reverse()
+
+    step = backward[node_id]
+    while step is not None:
+        (e, node) = step
+        path.append(e)
+        step = backward[node.id]
+    return path
+
+
+def connected_components(graph, relations=None):
+    """The components of the graph connected by the given relations (in either direction),
+    each a list of nodes in breadth first order, in the order of their first node."""
+    seen = set()
+    components = []
+    for node in graph.nodes:
+        if node.id not in seen:
+            component = [n for (n, depth, e) in bfs(graph, node, relations)]
+            seen.update(n.id for n in component)
+            components.append(component)
+    return components
+
+
+class QueryCache(object):
+
+    def __init__(self, maxsize=TRAVERSAL_CACHE_SIZE):
+        """A least recently used cache of query results that is cleared whenever the
+        version of the graph it belongs to changes.
+
+        >>> cache = QueryCache(maxsize=2)
+        >>> cache.get_or_compute(1, 'a', lambda: 'A'), cache.get_or_compute(1, 'a', lambda: 'other')
+        ('A', 'A')
+        >>> cache.get_or_compute(2, 'a', lambda: 'new')
+        'new'
+        >>> cache.hits, cache.misses
+        (1, 2)
+        """
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._results = collections.OrderedDict()
+
+    def get_or_compute(self, version, key, compute):
+        if version != self.version:
+            self._results.clear()
+            self.version = version
+
+        if key in self._results:
+            self.hits = self.hits + 1
+            self._results.move_to_end(key)
+            return self._results[key]
+
+        self.misses = self.misses + 1
+        result = compute()
+        self._results[key] = result
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+        return result
+
+    def clear(self):
+        self._results.clear()
@@ -0,0 +1,202 @@
+import h3graph.instrument as instrument
+from h3graph.degrees import DegreeStatistics
+
+
+class PropertyFilter(object):
+
+    def __init__(self, key, values, include=True):
+        """A predicate on nodes or edges: the property key has one of the values (include)
+        or none of them (not include, a missing property counts as none). Unlike a lambda
+        it can be pickled, so it can be sent to worker processes.
+
+        :param key: The property.
+        :param values: The values.
+        :param include: Whether elements with one of the values pass or the others.
+        """
+        self.key = key
+        self.values = frozenset(values)
+        self.include = include
+
+    def __call__(self, element):
+        return (element.get(self.key) in self.values) == self.include
+
+
+def property_in(key, *values):
+    """A predicate on nodes or edges: the property key has one of the values."""
+    return PropertyFilter(key, values)
+
+
+def property_not_in(key, *values):
+    """A predicate on nodes or edges: the property key has none of the values (or is missing).
+
+    >>> from h3graph import Edge, Node
+    >>> no_parents = property_not_in('relation', 'father', 'mother')
+    >>> no_parents(Edge(Node(1), Node(2), relation='sibling'))
+    True
+    >>> no_parents(Edge(Node(1), Node(2), relation='mother'))
+    False
+    """
+    return PropertyFilter(key, values, include=False)
+
+
+class GraphView(object):
+
+    def __init__(self, graph, node_filter=None, edge_filter=None):
+        """A filtered view of a graph, with the interface layout engines and draw_graph use.
+
+        The view holds no nodes or edges of its own: it selects those of the graph that pass
+        the filters, lazily on first use. The selection, the degrees within the view and its
+        degree statistics are kept until Graph.version changes; positions set by a layout are
+        the ones of the graph's nodes. Edges are only part of the view if both their nodes are.
+
+        :param graph: The graph.
+        :param node_filter: A predicate on nodes, or a dict of properties the nodes must have
+                            (answered from the property indexes, see Graph.query_nodes).
+        :param edge_filter: A predicate on edges, or a dict of properties the edges must have.
+        """
+        self.graph = graph
+        self._node_filters = [] if node_filter is None else [node_filter]
+        self._edge_filters = [] if edge_filter is None else [edge_filter]
+        self._sort_property = None
+        self._version = None
+
+    def filter(self, node_filter=None, edge_filter=None):
+        """Returns a view of the nodes and edges of this view that also pass the given filters."""
+        view = GraphView(self.graph)
+        view._node_filters = self._node_filters + ([] if node_filter is None else [node_filter])
+        view._edge_filters = self._edge_filters + ([] if edge_filter is None else [edge_filter])
+        view._sort_property = self._sort_property
+        return view
+
+    @staticmethod
+    def _select(elements, filters, query):
+        # the property dicts are answered from the indexes, the predicates checked afterwards
+        selected = None
+        for properties in (f for f in filters if isinstance(f, dict)):
+            matches = set(map(id, query(**properties)))
+            selected = matches if selected is None else selected & matches
+        predicates = [f for f in filters if not isinstance(f, dict)]
+
+        if selected is None and not predicates:
+            return list(elements)
+        return [e for e in elements
+                if (selected is None or id(e) in selected) and all(p(e) for p in predicates)]
+
+    def _update(self):
+        graph = self.graph
+        if self._version == graph.version:
+            return
+
+        nodes = self._select(graph.nodes, self._node_filters, graph.query_nodes)
+        node_ids = set(id(n) for n in nodes)
+        edges = [e for e in self._select(graph.edges, self._edge_filters, graph.query_edges)
+                 if id(e.sourceNode) in node_ids and id(e.targetNode) in node_ids]
+
+        # degrees within the view, single edge nodes in order of their first edge
+        degrees = dict((id(n), 0) for n in nodes)
+        first_edge = dict()
+        for (i, e) in enumerate(edges):
+            for node in (e.sourceNode, e.targetNode):
+                degrees[id(node)] = degrees[id(node)] + 1
+                first_edge.setdefault(id(node), (i, node))
+        single_edge_nodes = [node for (i, node)
+                             in sorted(first_edge.values(), key=lambda item: item[0])
+                             if degrees[id(node)] == 1 or node.id in graph.pinned_node_ids]
+
+        self._nodes = nodes
+        self._node_ids = node_ids
+        self._edges = edges
+        self._edge_ids = set(map(id, edges))
+        self._degrees = degrees
+        self._single_edge_nodes = single_edge_nodes
+        self._single_edge_node_ids = set(map(id, single_edge_nodes))
+        self._degree_statistics = DegreeStatistics(degrees.values())
+        self._version = graph.version
+        if self._sort_property is not None:
+            self.sort_nodes_by_property(self._sort_property)
+
+    @property
+    def nodes(self):
+        self._update()
+        return self._nodes
+
+    @property
+    def edges(self):
+        self._update()
+        return self._edges
+
+    def get_nodes(self):
+        return self.nodes
+
+    def get_edges(self):
+        return self.edges
+
+    def find_node_by_id(self, id_):
+        node = self.graph.find_node_by_id(id_)
+        self._update()
+        return node if node is not None and id(node) in self._node_ids else None
+
+    def get_incident_edges(self, node):
+        self._update()
+        return [e for e in self.graph.get_incident_edges(node) if id(e) in self._edge_ids]
+
+    def get_neighbours_of(self, node):
+        result = []
+        for e in self.get_incident_edges(node):
+            if e.sourceNode != node:
+                result.append(e.sourceNode)
+            if e.targetNode != node:
+                result.append(e.targetNode)
+        return result
+
+    def get_degree(self, node):
+        self._update()
+        return self._degrees.get(id(node), 0)
+
+    def get_single_edge_nodes(self):
+        self._update()
+        return list(self._single_edge_nodes)
+
+    def is_single_edge_node(self, node):
+        self._update()
+        return id(node) in self._single_edge_node_ids
+
+    @property
+    def max_edge_count(self):
+        self._update()
+        return self._degree_statistics.max()
+
+    @property
+    def median_edge_count(self):
+        self._update()
+        return self._degree_statistics.median()
+
+    @property
+    def mean_edge_count(self):
+        self._update()
+        return self._degree_statistics.mean()
+
+    def sort_nodes_by_property(self, property_name):
+        """Sorts the nodes of the view (not of the graph),
+        they stay sorted when the view is updated."""
+        self._sort_property = property_name
+        self.nodes.sort(key=lambda node: str(getattr(node, property_name, '')))
+
+    def define_node_positions(self, layout="circular"):
+        """Sets the x and y coordinates of the nodes of the view,
+        see Graph.define_node_positions."""
+        from h3graph.layout import get_layout
+        with instrument.stage("define_node_positions"):
+            get_layout(layout).apply(self)
+
+    def draw(self, output="res.svg", cache=None, image_hrefs=None):
+        import h3graph.draw as draw
+        with instrument.stage("draw"):
+            draw.draw_graph(self, output, cache, image_hrefs)
+
+    def draw_tiles(self, directory, zoom_levels=None, image_hrefs=None):
+        """Draws the graph as tiles at several zoom levels into directory (see Graph.draw_tiles)."""
+        import h3graph.tiles as tiles
+        with instrument.stage("draw_tiles"):
+            tiles.draw_tiles(self, directory, zoom_levels or tiles.ZOOM_LEVELS,
+                             image_hrefs=image_hrefs)
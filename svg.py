@@ -1,13 +1,15 @@
-import h3graph
+"""Draws got.graphml to res.svg,
+the options are those of python -m h3graph render (see h3graph.cli).
+"""
+import sys
 
+from h3graph.cli import main
 
-def main():
-    graph = h3graph.Graph()
-    graph.load('got.graphml')
-    graph.define_node_positions()
-    graph.update_graph()
-    graph.draw()
+# Characters that are placed on the outer circle although they have more than one edge:
+# Drogo, Olly, Shae, Alliser Thorne and Beric Dondarrion
+PINNED_NODE_IDS = {44, 56, 63, 73, 74}
 
 
 if __name__ == '__main__':
-    main()
+    pins = ["--pin=%d" % id for id in sorted(PINNED_NODE_IDS)]
+    main(["render", "got.graphml"] + pins + sys.argv[1:])